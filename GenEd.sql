@@ -16,6 +16,19 @@ CREATE TABLE users(
 );
 
 
+#daily usage of uploads, summaries and video generation per user
+CREATE TABLE usage_quotas (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    quota_date DATE NOT NULL,
+    uploads INT NOT NULL DEFAULT 0,
+    videos INT NOT NULL DEFAULT 0,
+    summaries INT NOT NULL DEFAULT 0,
+
+    UNIQUE KEY uq_usage_quotas_user_date (user_id, quota_date),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 #documents table to store uploaded documents
 CREATE TABLE documents (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -23,8 +36,12 @@ CREATE TABLE documents (
     doc_name VARCHAR(255) NOT NULL,
     file_path VARCHAR(255) NOT NULL,
     extracted_text TEXT NULL,
+    gemini_file_name VARCHAR(255) NULL,
+    gemini_file_expires_at TIMESTAMP NULL,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
+    INDEX ix_documents_gemini_file_name (gemini_file_name),
+    INDEX ix_documents_gemini_file_expires_at (gemini_file_expires_at),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -47,6 +64,9 @@ CREATE TABLE videos (
     summary_id INT NULL,
     video_name VARCHAR(255) NOT NULL,
     video_path VARCHAR(255) NOT NULL,
+    hls_path VARCHAR(255) NULL,
+    thumbnail_path VARCHAR(255) NULL,
+    processing_status VARCHAR(20) NOT NULL DEFAULT 'pending',
     generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
@@ -66,3 +86,74 @@ CREATE TABLE downloads (
 );
 
 
+
+
+#precomputed per-user usage counters
+CREATE TABLE user_stats (
+    user_id INT PRIMARY KEY,
+    documents INT NOT NULL DEFAULT 0,
+    summaries INT NOT NULL DEFAULT 0,
+    videos INT NOT NULL DEFAULT 0,
+    downloads INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+#precomputed per-video download counters
+CREATE TABLE video_stats (
+    video_id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    downloads INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    INDEX ix_video_stats_downloads (downloads),
+    FOREIGN KEY (video_id) REFERENCES videos(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+#MinHash signatures of document and summary texts for near-duplicate lookups
+CREATE TABLE similarity_signatures (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(10) NOT NULL,
+    item_id INT NOT NULL,
+    user_id INT NOT NULL,
+    signature BLOB NOT NULL,
+
+    UNIQUE KEY uq_similarity_signatures_item (kind, item_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+#LSH band keys of the signatures, looked up by (user_id, band_key)
+CREATE TABLE similarity_bands (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(10) NOT NULL,
+    item_id INT NOT NULL,
+    user_id INT NOT NULL,
+    band SMALLINT NOT NULL,
+    band_key BIGINT NOT NULL,
+
+    INDEX ix_similarity_bands_user_key (user_id, band_key),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+#upgrading an existing database: cached Gemini file handles on documents
+#ALTER TABLE documents
+#    ADD COLUMN gemini_file_name VARCHAR(255) NULL,
+#    ADD COLUMN gemini_file_expires_at TIMESTAMP NULL,
+#    ADD INDEX ix_documents_gemini_file_name (gemini_file_name),
+#    ADD INDEX ix_documents_gemini_file_expires_at (gemini_file_expires_at);
+
+#upgrading an existing database: HLS renditions and thumbnails for videos
+#ALTER TABLE videos
+#    ADD COLUMN hls_path VARCHAR(255) NULL,
+#    ADD COLUMN thumbnail_path VARCHAR(255) NULL,
+#    ADD COLUMN processing_status VARCHAR(20) NOT NULL DEFAULT 'pending';
+
+#upgrading an existing database: daily quota for streamed summaries
+#ALTER TABLE usage_quotas
+#    ADD COLUMN summaries INT NOT NULL DEFAULT 0;
+
+#upgrading an existing database: near-duplicate lookups moved from memory to the database
+#create similarity_signatures and similarity_bands as above, then index the existing texts with
+#python -m app.similarity backfill
@@ -0,0 +1,146 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import json
+import mimetypes
+from typing import Dict
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, HTMLResponse, Response
+from starlette.datastructures import Headers
+from app.compression import parse_accept_encoding
+
+try:
+    import brotli  # optional, only used to precompress static assets
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".html", ".svg", ".json", ".txt"}
+
+
+#write to a temp file in the same directory and rename it into place, so a crash or
+#a second worker building at the same time never leaves a truncated file behind
+def write_atomic(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates 0600 files, assets must stay readable for e.g. a front proxy
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+#build content-hashed copies of every static file into build_dir
+#returns a manifest mapping "styles.css" -> "styles.<hash>.css"
+def build_static_assets(static_dir: str, build_dir: str) -> Dict[str, str]:
+    os.makedirs(build_dir, exist_ok=True)
+    manifest = {}
+
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            source = os.path.join(root, name)
+            rel_path = os.path.relpath(source, static_dir).replace(os.sep, "/")
+
+            with open(source, "rb") as f:
+                content = f.read()
+
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            stem, ext = os.path.splitext(rel_path)
+            hashed_path = f"{stem}.{digest}{ext}"
+            target = os.path.join(build_dir, hashed_path)
+            manifest[rel_path] = hashed_path
+
+            # precompress text assets once so requests never pay for it
+            variants = {}
+            if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                variants[target + ".gz"] = lambda: gzip.compress(content, compresslevel=9, mtime=0)
+                if brotli is not None:
+                    variants[target + ".br"] = lambda: brotli.compress(content, quality=11)
+
+            # same hash means same content, nothing to rebuild
+            if os.path.exists(target) and all(os.path.exists(path) for path in variants):
+                continue
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # the compressed variants go first, so an existing target means a complete set
+            for path, build in variants.items():
+                write_atomic(path, build())
+            write_atomic(target, content)
+
+    write_atomic(os.path.join(build_dir, "manifest.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+
+    return manifest
+
+
+#static files app that serves fingerprinted assets with long-lived caching
+#and picks a precompressed .br/.gz variant when the browser accepts it
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *, static_dir: str, build_dir: str, manifest: Dict[str, str], **kwargs):
+        # the original directory still serves un-hashed urls (e.g. old bookmarks)
+        super().__init__(directory=static_dir, **kwargs)
+        self.build_dir = build_dir
+        self.hashed_paths = set(manifest.values())
+
+    async def get_response(self, path: str, scope) -> Response:
+        path = path.replace(os.sep, "/")
+        if path not in self.hashed_paths:
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+            return response
+
+        weights = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        full_path = os.path.join(self.build_dir, path)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        # highest q-value first, brotli on ties; q=0 (or not listed) is never sent
+        variants = sorted((("br", ".br"), ("gzip", ".gz")), key=lambda v: -weights.get(v[0], weights.get("*", 0.0)))
+        for encoding, suffix in variants:
+            if weights.get(encoding, weights.get("*", 0.0)) > 0 and os.path.isfile(full_path + suffix):
+                headers["Content-Encoding"] = encoding
+                return FileResponse(full_path + suffix, media_type=media_type, headers=headers)
+
+        return FileResponse(full_path, media_type=media_type, headers=headers)
+
+
+#jinja environment with compiled templates cached as bytecode on disk
+def create_template_env(templates_dir: str, cache_dir: str, manifest: Dict[str, str]) -> Environment:
+    os.makedirs(cache_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(templates_dir),
+        autoescape=select_autoescape(["html", "xml"]),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        auto_reload=os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() == "true",
+    )
+    env.globals["asset_url"] = lambda path: "/static/" + manifest.get(path, path)
+    env.globals["asset_exists"] = lambda path: path in manifest
+
+    # compile every template up front so the first request doesn't pay for it
+    for name in env.list_templates():
+        env.get_template(name)
+
+    return env
+
+
+#pages whose html does not depend on the user are rendered once and reused
+class PrerenderedPage:
+    def __init__(self, html: str):
+        self.body = html.encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:16] + '"'
+
+    def response(self, request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(content=self.body, headers=headers)
+
+
+def prerender_pages(env: Environment, names) -> Dict[str, PrerenderedPage]:
+    return {name: PrerenderedPage(env.get_template(name).render()) for name in names}
@@ -0,0 +1,203 @@
+#bulk import of users and documents
+#usage:
+#   python -m app.bulk_import users users.csv
+#   python -m app.bulk_import documents ./school_notes --user-id 3
+#an interrupted import picks up where it stopped when run again with the same checkpoint file
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+import time
+from itertools import islice
+from pathlib import Path
+
+from app import crud, extraction, schemas
+
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+UPLOAD_DIR = Path("media/uploads")
+
+
+#tracks how many input records have been committed so far, and whether the import finished
+#(media_gc keeps the inputs of unfinished imports so they can be resumed)
+class Checkpoint:
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.done = 0
+        if self.path and self.path.exists():
+            with open(self.path) as f:
+                self.done = json.load(f).get("done", 0)
+
+    def save(self, done, finished=False):
+        self.done = done
+        if not self.path:
+            return
+        # write then rename so a crash never leaves a half-written checkpoint
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"done": done, "finished": finished, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+#stream user records from a .csv (with a header row) or .jsonl file
+def iter_user_records(path):
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+#list importable files under a directory in a stable order so checkpoints stay valid
+def iter_document_files(directory):
+    for path in sorted(Path(directory).rglob("*")):
+        if path.is_file() and path.suffix.lower() in extraction.ALLOWED_EXTENSIONS:
+            yield path
+
+
+def import_users(session_factory, path, checkpoint_path=None, batch_size=BATCH_SIZE, workers=None):
+    checkpoint = Checkpoint(checkpoint_path)
+    report = {"imported": 0, "skipped": 0, "invalid": 0, "resumed_from": checkpoint.done}
+    records = islice(iter_user_records(path), checkpoint.done, None)
+    workers = workers or os.cpu_count() or 1
+    checkpoint.save(checkpoint.done)
+
+    with extraction.create_pool(workers) as pool:
+        for batch in batched(records, batch_size):
+            users = []
+            for record in batch:
+                try:
+                    users.append(schemas.UserCreate(**{k: v for k, v in record.items() if v not in ("", None)}))
+                except Exception:
+                    report["invalid"] += 1
+
+            db = session_factory()
+            try:
+                taken_usernames, taken_emails = crud.get_existing_usernames_and_emails(
+                    db, [u.username for u in users], [u.email for u in users]
+                )
+                new_users = []
+                for user in users:
+                    if user.username in taken_usernames or user.email in taken_emails:
+                        report["skipped"] += 1
+                        continue
+                    # also drop duplicates inside the same file
+                    taken_usernames.add(user.username)
+                    taken_emails.add(user.email)
+                    new_users.append(user)
+
+                # argon2 is deliberately slow, so spread it over all cores
+                chunksize = max(1, len(new_users) // (4 * workers))
+                hashed = list(pool.map(crud.hash_password, [u.password for u in new_users], chunksize=chunksize))
+                report["imported"] += crud.bulk_create_users(db, new_users, hashed)
+            finally:
+                db.close()
+
+            checkpoint.save(checkpoint.done + len(batch))
+            print(f"users: {checkpoint.done} records processed", flush=True)
+
+    checkpoint.save(checkpoint.done, finished=True)
+    return report
+
+
+def import_documents(session_factory, directory, user_id, checkpoint_path=None, batch_size=BATCH_SIZE, workers=None):
+    checkpoint = Checkpoint(checkpoint_path)
+    report = {"imported": 0, "skipped": 0, "resumed_from": checkpoint.done}
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+    db = session_factory()
+    try:
+        if not crud.get_user(db, user_id):
+            raise ValueError(f"User {user_id} not found")
+    finally:
+        db.close()
+
+    files = islice(iter_document_files(directory), checkpoint.done, None)
+    # upload names are derived from the import and the file's position, not the clock, so a batch
+    # that was committed just before a crash (but not checkpointed) is recognised and skipped on resume
+    import_key = hashlib.sha1(str(Path(checkpoint_path or directory).resolve()).encode("utf-8")).hexdigest()[:12]
+    checkpoint.save(checkpoint.done)
+
+    # --workers gets a pool of its own, otherwise the shared extraction pool is used
+    pool = extraction.create_pool(workers) if workers else extraction.get_pool()
+    try:
+        for batch in batched(files, batch_size):
+            targets = [
+                (source, UPLOAD_DIR / f"{user_id}_import_{import_key}_{index}_{source.name}")
+                for index, source in enumerate(batch, start=checkpoint.done)
+            ]
+
+            db = session_factory()
+            try:
+                db.use_primary()
+                already_imported = crud.get_existing_file_paths(db, [str(target) for _, target in targets])
+
+                docs = []
+                for source, target in targets:
+                    if str(target) in already_imported:
+                        report["skipped"] += 1
+                        continue
+                    shutil.copyfile(source, target)
+                    docs.append(schemas.DocumentCreate(user_id=user_id, doc_name=source.name, file_path=str(target)))
+
+                # pdf/docx parsing and OCR are cpu bound, run them in the worker pool
+                texts = extraction.extract_many([doc.file_path for doc in docs], pool)
+                report["imported"] += crud.bulk_create_documents(db, docs, texts)
+            finally:
+                db.close()
+
+            checkpoint.save(checkpoint.done + len(batch))
+            print(f"documents: {checkpoint.done} files processed", flush=True)
+    finally:
+        if workers:
+            pool.shutdown()
+
+    checkpoint.save(checkpoint.done, finished=True)
+    return report
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import users or documents")
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    users_parser = subparsers.add_parser("users", help="import users from a .csv or .jsonl file")
+    users_parser.add_argument("path")
+
+    docs_parser = subparsers.add_parser("documents", help="import every supported file in a directory")
+    docs_parser.add_argument("path")
+    docs_parser.add_argument("--user-id", type=int, required=True)
+
+    for sub in (users_parser, docs_parser):
+        sub.add_argument("--checkpoint", help="checkpoint file (default: <path>.checkpoint)")
+        sub.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        sub.add_argument("--workers", type=int, default=None)
+
+    args = parser.parse_args()
+    checkpoint_path = args.checkpoint or str(Path(args.path)) + ".checkpoint"
+
+    if args.kind == "users":
+        report = import_users(SessionLocal, args.path, checkpoint_path, args.batch_size, args.workers)
+    else:
+        report = import_documents(SessionLocal, args.path, args.user_id, checkpoint_path, args.batch_size, args.workers)
+
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
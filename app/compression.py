@@ -0,0 +1,111 @@
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # optional, gzip is used when it is missing
+except ImportError:
+    brotli = None
+
+# content types that are already compressed or must reach the client unbuffered
+SKIP_CONTENT_TYPES = ("text/event-stream", "video/", "image/", "audio/", "application/octet-stream", "application/zip")
+
+
+#q-value of each encoding in an Accept-Encoding header, e.g. {"br": 0.0, "gzip": 1.0}
+def parse_accept_encoding(accept_encoding: str):
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.lower()] = q
+    return weights
+
+
+#pick the encoding the client prefers by q-value, brotli on ties; q=0 means "not acceptable"
+def choose_encoding(accept_encoding: str):
+    weights = parse_accept_encoding(accept_encoding)
+    wildcard = weights.get("*", 0.0)
+    candidates = []
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        q = weights.get(encoding, wildcard)
+        if q > 0:
+            candidates.append((q, encoding))
+    if not candidates:
+        return None
+    # max keeps the first of equal q-values, so brotli wins ties
+    return max(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+#asgi middleware that gzip/brotli-compresses single-body responses above minimum_size
+#streamed responses (file downloads, server-sent events) are passed through untouched
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or content_type.startswith(SKIP_CONTENT_TYPES):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            # streaming or tiny bodies are not worth buffering/compressing
+            if more_body or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,8 +1,13 @@
 from sqlalchemy.orm import Session#import Session from SQLAlchemy
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+import datetime
 from app import schemas#import schemas.py
-from app.models import User, Document, Summary, Video, Download#import models.py
+from app import similarity
+from app.models import User, UserRole, Document, Summary, Video, Download, UserStats, VideoStats, UsageQuota#import models.py
 from passlib.context import CryptContext#import passlib for hashing passwords
-from typing import Optional
+from typing import Optional, List, Set
+from collections import Counter
 
 
 pwd_context= CryptContext(schemes=["argon2"], deprecated="auto")#set up password hashing context
@@ -15,6 +20,87 @@ def hash_password(password:str):
 def verify_password(plain:str, hashed:str):
     return pwd_context.verify(plain, hashed)
 
+#run update(); when it matched no row, insert make_row() inside a savepoint.
+#if a concurrent request inserted the row first, only the savepoint is rolled back and the update retried
+def _update_or_insert(db: Session, update, make_row):
+    for _ in range(2):
+        if update():
+            return
+        try:
+            with db.begin_nested():
+                db.add(make_row())
+            return
+        except IntegrityError:
+            pass
+    update()
+
+#add amount to one of the user's counters (documents, summaries, videos, downloads)
+#done as an UPDATE so concurrent writers don't overwrite each other
+def bump_user_stat(db: Session, user_id: int, field: str, amount: int = 1):
+    column = getattr(UserStats, field)
+    _update_or_insert(
+        db,
+        lambda: db.query(UserStats).filter(UserStats.user_id == user_id).update(
+            {column: column + amount}, synchronize_session=False
+        ),
+        lambda: UserStats(user_id=user_id, **{field: amount}),
+    )
+
+#add amount to a video's download counter
+def bump_video_downloads(db: Session, video_id: int, user_id: int, amount: int = 1):
+    _update_or_insert(
+        db,
+        lambda: db.query(VideoStats).filter(VideoStats.video_id == video_id).update(
+            {VideoStats.downloads: VideoStats.downloads + amount}, synchronize_session=False
+        ),
+        lambda: VideoStats(video_id=video_id, user_id=user_id, downloads=amount),
+    )
+
+#get the precomputed counters of a user
+def get_user_stats(db: Session, user_id: int) -> Optional[UserStats]:
+    return db.query(UserStats).filter(UserStats.user_id == user_id).first()
+
+#get the most downloaded videos (served from the downloads index)
+def get_top_videos(db: Session, limit: int = 10):
+    return db.query(VideoStats).order_by(VideoStats.downloads.desc()).limit(limit).all()
+
+#use one unit of today's quota for kind ("uploads" or "videos")
+#returns False when the user has already reached limit today
+def consume_quota(db: Session, user_id: int, kind: str, limit: int) -> bool:
+    column = getattr(UsageQuota, kind)
+    today = datetime.date.today()
+    for _ in range(2):
+        # conditional increment, so parallel requests can't go over the limit
+        updated = db.query(UsageQuota).filter(
+            UsageQuota.user_id == user_id, UsageQuota.quota_date == today, column < limit
+        ).update({column: column + 1}, synchronize_session=False)
+        if updated:
+            db.commit()
+            return True
+
+        if db.query(UsageQuota.id).filter(UsageQuota.user_id == user_id, UsageQuota.quota_date == today).first():
+            db.rollback()
+            return False
+
+        if limit < 1:
+            return False
+        try:
+            db.add(UsageQuota(user_id=user_id, quota_date=today, **{kind: 1}))
+            db.commit()
+            return True
+        except IntegrityError:
+            # another request created today's row first, retry the update
+            db.rollback()
+    return False
+
+#give back a unit consumed by consume_quota when the request then failed
+def release_quota(db: Session, user_id: int, kind: str):
+    column = getattr(UsageQuota, kind)
+    db.query(UsageQuota).filter(
+        UsageQuota.user_id == user_id, UsageQuota.quota_date == datetime.date.today(), column > 0
+    ).update({column: column - 1}, synchronize_session=False)
+    db.commit()
+
 #create new user
 def create_user(db:Session, user: schemas.UserCreate):
     hashed_password=hash_password(user.password)
@@ -28,11 +114,46 @@ def create_user(db:Session, user: schemas.UserCreate):
         role=user.role or "user"
     )
     db.add(db_user)
+    db.flush()
+    db.add(UserStats(user_id=db_user.id))
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
+#create many users with a single insert and commit
+#passwords must already be hashed (the bulk importer hashes them in worker processes)
+def bulk_create_users(db: Session, users: List[schemas.UserCreate], hashed_passwords: List[str]):
+    rows = [
+        {
+            "fullname": user.fullname,
+            "username": user.username,
+            "email": user.email,
+            "password": hashed,
+            "phone_number": user.phone_number,
+            "role": user.role or UserRole.user,
+        }
+        for user, hashed in zip(users, hashed_passwords)
+    ]
+    if rows:
+        db.execute(insert(User), rows)
+        # every user gets a stats row up front, like create_user does
+        usernames = [row["username"] for row in rows]
+        user_ids = [row[0] for row in db.query(User.id).filter(User.username.in_(usernames))]
+        db.execute(insert(UserStats), [{"user_id": user_id} for user_id in user_ids])
+        db.commit()
+    return len(rows)
+
+#return the usernames and emails from the given lists that are already taken
+def get_existing_usernames_and_emails(db: Session, usernames: List[str], emails: List[str]):
+    taken_usernames: Set[str] = set()
+    taken_emails: Set[str] = set()
+    if usernames:
+        taken_usernames = {row[0] for row in db.query(User.username).filter(User.username.in_(usernames))}
+    if emails:
+        taken_emails = {row[0] for row in db.query(User.email).filter(User.email.in_(emails))}
+    return taken_usernames, taken_emails
+
 #get all users
 def get_all_users(db: Session):
     return db.query(User).all()
@@ -57,12 +178,51 @@ def create_document(db: Session, doc: schemas.DocumentCreate):
         user_id=doc.user_id,
         doc_name=doc.doc_name,
         file_path=doc.file_path,
+        extracted_text=doc.extracted_text,
+        gemini_file_name=doc.gemini_file_name,
+        gemini_file_expires_at=doc.gemini_file_expires_at,
     )
     db.add(db_doc)
+    db.flush()
+    # the near-duplicate index rows commit together with the document
+    similarity.index_document(db, db_doc)
+    bump_user_stat(db, doc.user_id, "documents")
     db.commit()
     db.refresh(db_doc)
     return db_doc
 
+#create many documents with a single insert and commit
+def bulk_create_documents(db: Session, docs: List[schemas.DocumentCreate], extracted_texts: List[str]):
+    rows = [
+        {
+            "user_id": doc.user_id,
+            "doc_name": doc.doc_name,
+            "file_path": doc.file_path,
+            "extracted_text": text,
+        }
+        for doc, text in zip(docs, extracted_texts)
+    ]
+    if rows:
+        db.execute(insert(Document), rows)
+        # executemany doesn't return ids, the upload paths are unique so look them up by those
+        texts_by_path = {row["file_path"]: row["extracted_text"] for row in rows}
+        inserted = db.query(Document.id, Document.user_id, Document.file_path).filter(
+            Document.file_path.in_(list(texts_by_path))
+        )
+        similarity.add_entries(db, [
+            ("document", doc_id, user_id, texts_by_path[file_path]) for doc_id, user_id, file_path in inserted
+        ])
+        for user_id, count in Counter(doc.user_id for doc in docs).items():
+            bump_user_stat(db, user_id, "documents", count)
+        db.commit()
+    return len(rows)
+
+#return the file paths from the given list that a document already points to
+def get_existing_file_paths(db: Session, file_paths: List[str]) -> Set[str]:
+    if not file_paths:
+        return set()
+    return {row[0] for row in db.query(Document.file_path).filter(Document.file_path.in_(file_paths))}
+
 #get document by id
 def get_document(db: Session, doc_id: int):
     return db.query(Document).filter(Document.id == doc_id).first()
@@ -71,6 +231,26 @@ def get_document(db: Session, doc_id: int):
 def get_documents_by_user(db: Session, user_id: int):
     return db.query(Document).filter(Document.user_id == user_id).all()
 
+#remember the Gemini file uploaded for a document so later calls can reuse it
+def set_document_file_handle(db: Session, doc: Document, file_name: str, expires_at):
+    doc.gemini_file_name = file_name
+    doc.gemini_file_expires_at = expires_at
+    db.commit()
+    return doc
+
+#drop Gemini file handles that have expired
+def clear_expired_file_handles(db: Session, now):
+    cleared = db.query(Document).filter(Document.gemini_file_expires_at < now).update(
+        {Document.gemini_file_name: None, Document.gemini_file_expires_at: None}, synchronize_session=False
+    )
+    db.commit()
+    return cleared
+
+#return which of the given Gemini file names are still stored on a document
+def get_referenced_file_names(db: Session, file_names: List[str]) -> Set[str]:
+    rows = db.query(Document.gemini_file_name).filter(Document.gemini_file_name.in_(file_names))
+    return {row[0] for row in rows}
+
 #create new summary
 def create_summary(db: Session, data: schemas.SummaryCreate):
     db_summary = Summary(
@@ -79,6 +259,9 @@ def create_summary(db: Session, data: schemas.SummaryCreate):
         document_id=data.document_id
     )
     db.add(db_summary)
+    db.flush()
+    similarity.index_summary(db, db_summary)
+    bump_user_stat(db, data.user_id, "summaries")
     db.commit()
     db.refresh(db_summary)
     return db_summary
@@ -91,6 +274,10 @@ def get_summary(db: Session, summary_id: int):
 def get_summaries_by_user(db: Session, user_id: int):
     return db.query(Summary).filter(Summary.user_id == user_id).all()
 
+#get summaries made from a document
+def get_summaries_by_document(db: Session, document_id: int):
+    return db.query(Summary).filter(Summary.document_id == document_id).all()
+
 #create new video
 def create_video(db: Session, v: schemas.VideoCreate):
     db_video = Video(
@@ -101,6 +288,9 @@ def create_video(db: Session, v: schemas.VideoCreate):
         video_path=v.video_path,
     )
     db.add(db_video)
+    db.flush()
+    db.add(VideoStats(video_id=db_video.id, user_id=v.user_id))
+    bump_user_stat(db, v.user_id, "videos")
     db.commit()
     db.refresh(db_video)
     return db_video
@@ -113,6 +303,15 @@ def get_video(db: Session, video_id: int):
 def get_videos_by_user(db: Session, user_id: int):
     return db.query(Video).filter(Video.user_id == user_id).all()
 
+#get videos made from a document or from a summary
+def get_videos_by_source(db: Session, document_id: Optional[int] = None, summary_id: Optional[int] = None):
+    query = db.query(Video)
+    if document_id is not None:
+        query = query.filter(Video.document_id == document_id)
+    if summary_id is not None:
+        query = query.filter(Video.summary_id == summary_id)
+    return query.all()
+
 #create new download record
 def create_download(db: Session, data: schemas.DownloadCreate):
     db_download = Download(
@@ -120,6 +319,9 @@ def create_download(db: Session, data: schemas.DownloadCreate):
         video_id=data.video_id
     )
     db.add(db_download)
+    bump_user_stat(db, data.user_id, "downloads")
+    video = get_video(db, data.video_id)
+    bump_video_downloads(db, data.video_id, video.user_id if video else data.user_id)
     db.commit()
     db.refresh(db_download)
     return db_download
@@ -1,8 +1,12 @@
 import os
+import itertools
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql import Select
 
 load_dotenv()  # load environment variables from .env file
 DATABASE_URL = os.getenv("DATABASE_URL",None)
@@ -16,8 +20,139 @@ if not DATABASE_URL:
     # ensure charset utf8mb4 for emoji/utf8 support
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
 
+# comma separated read replica urls, e.g. "mysql+pymysql://...@replica1/GenEd,mysql+pymysql://...@replica2/GenEd"
+# (for local testing several sqlite files work too: "sqlite:///replica1.db,sqlite:///replica2.db")
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "10"))
+# after a user writes, their reads stay on the primary this long (covers replica lag)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+
+#round-robin over the replica engines that passed their last health check
+#health checks run in a background thread, so a dead replica never stalls a request;
+#a replica that fails is out of rotation until a later check succeeds
+class ReplicaPool:
+    def __init__(self, engines, check_interval: float = REPLICA_HEALTH_CHECK_INTERVAL, background: bool = True):
+        self.engines = engines
+        self.check_interval = check_interval
+        self.healthy = {engine: True for engine in engines}
+        self.lock = threading.Lock()
+        self._cycle = itertools.cycle(engines) if engines else None
+        self._stop = threading.Event()
+        self._thread = None
+        if engines and background:
+            self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+            self._thread.start()
+
+    def check(self, engine) -> bool:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            healthy = True
+        except Exception as e:
+            print(f"Replica {engine.url.render_as_string(hide_password=True)} failed health check: {e}")
+            healthy = False
+        with self.lock:
+            self.healthy[engine] = healthy
+        return healthy
+
+    def check_all(self):
+        for engine in self.engines:
+            self.check(engine)
+
+    def _run(self):
+        self.check_all()
+        while not self._stop.wait(self.check_interval):
+            self.check_all()
+
+    def stop(self):
+        self._stop.set()
+
+    def mark_unhealthy(self, engine):
+        with self.lock:
+            self.healthy[engine] = False
+
+    #next healthy replica, or None when reads should go to the primary
+    def choose(self):
+        with self.lock:
+            for _ in range(len(self.engines)):
+                engine = next(self._cycle)
+                if self.healthy[engine]:
+                    return engine
+        return None
+
+
+#session that sends plain SELECTs to a replica and everything else to the primary
+#once a session has written (flush/commit) it stays on the primary, so it reads its own writes.
+#to carry that across sessions (e.g. the next request of the same user), pass
+#primary_until (a time.time() deadline) and on_write (called after a commit that wrote)
+class RoutingSession(Session):
+    def __init__(self, *args, primary=None, replicas=None, primary_until: float = 0.0, on_write=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        self.replicas = replicas
+        self.primary_until = primary_until
+        self.on_write = on_write
+        self.sticky_primary = False
+        self.wrote = False
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.sticky_primary or self._flushing or not self.replicas or not isinstance(clause, Select):
+            return self.primary
+        if clause._for_update_arg is not None or time.time() < self.primary_until:
+            return self.primary
+
+        # keep the same replica for the whole transaction so reads are consistent
+        if self._replica is None:
+            self._replica = self.replicas.choose()
+        return self._replica or self.primary
+
+    def use_primary(self):
+        self.sticky_primary = True
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _stick_after_flush(session, flush_context, instances):
+    session.wrote = True
+    session.use_primary()
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_after_commit(session):
+    session.use_primary()
+    if session.wrote and session.on_write:
+        session.on_write()
+    session.wrote = False
+
+
+#bulk update/delete/insert statements don't flush, so catch them here
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _stick_after_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.wrote = True
+        orm_execute_state.session.use_primary()
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _forget_replica(session, transaction):
+    session._replica = None
+
+
+#a replica that errors mid-query is taken out of rotation straight away
+def _watch_replica(engine, replicas):
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        if context.is_disconnect or context.connection is None:
+            replicas.mark_unhealthy(engine)
+
+
 # engine and session setup
 engine=create_engine(DATABASE_URL)
+replica_engines = [create_engine(url, pool_pre_ping=True) for url in DATABASE_REPLICA_URLS]
+replica_pool = ReplicaPool(replica_engines)
+for _replica_engine in replica_engines:
+    _watch_replica(_replica_engine, replica_pool)
 
-SessionLocal=sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base=declarative_base()
\ No newline at end of file
+SessionLocal=sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, primary=engine, replicas=replica_pool)
+Base=declarative_base()
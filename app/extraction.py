@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+# file types accepted by /upload and the bulk importer
+ALLOWED_EXTENSIONS = {'.txt', '.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# "gemini": try Gemini first and fall back to local extraction (default)
+# "local": try local extraction (including OCR) first and only call Gemini when it fails
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "gemini").lower()
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "0")) or None
+# large photos are downscaled before OCR, text stays readable and tesseract is much faster
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "2000"))
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "eng")
+
+_pool = None
+
+
+#OCR an image with tesseract after converting to grayscale and downscaling
+def ocr_image(file_path, max_dimension=OCR_MAX_DIMENSION):
+    from PIL import Image, ImageOps
+    import pytesseract
+
+    with Image.open(file_path) as image:
+        image = ImageOps.exif_transpose(image).convert("L")
+        if max_dimension:
+            image.thumbnail((max_dimension, max_dimension))
+        return pytesseract.image_to_string(image, lang=OCR_LANGUAGES).strip()
+
+
+#old binary .doc files are read with antiword or catdoc, whichever is installed
+def extract_legacy_doc(file_path):
+    for tool in ("antiword", "catdoc"):
+        binary = shutil.which(tool)
+        if binary:
+            result = subprocess.run([binary, str(file_path)], capture_output=True, timeout=120, check=True)
+            return result.stdout.decode("utf-8", errors="ignore").strip()
+    print("Cannot extract text from .doc files locally: install antiword or catdoc")
+    return None
+
+
+# placeholders that older versions stored as extracted_text when extraction failed
+LEGACY_PLACEHOLDERS = ("[Cannot extract text from", "[Local text extraction failed:", "[Text extraction failed:")
+
+
+#extraction results that are missing, too short or an old failure placeholder
+def is_usable_text(text):
+    return bool(text) and len(text.strip()) > 10 and not text.startswith(LEGACY_PLACEHOLDERS)
+
+
+#extract text from file using local libraries, None when the file can't be read locally
+#kept at module level so it can be sent to worker processes
+def extract_text_locally(file_path, file_ext):
+    try:
+        if file_ext == ".txt":
+            with open(file_path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        # python-docx and PyPDF2 are imported on first use to keep startup fast
+        elif file_ext == ".docx":
+            from docx import Document as DocxDocument
+            doc = DocxDocument(file_path)
+            return "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
+
+        elif file_ext == ".pdf":
+            import PyPDF2
+            with open(file_path, "rb") as f:
+                reader = PyPDF2.PdfReader(f)
+                text_parts = []
+                for page in reader.pages:
+                    page_text = page.extract_text()
+                    if page_text:
+                        text_parts.append(page_text)
+                return "\n".join(text_parts)
+
+        elif file_ext in IMAGE_EXTENSIONS:
+            return ocr_image(file_path)
+
+        elif file_ext == ".doc":
+            return extract_legacy_doc(file_path)
+
+        else:
+            print(f"Cannot extract text from {file_ext} files locally")
+            return None
+
+    except Exception as e:
+        print(f"Local text extraction failed for {file_path}: {e}")
+        return None
+
+
+#process pool whose workers are spawned, not forked: forking the threaded
+#web server can copy held locks (db pools, scheduler) into the children
+def create_pool(workers=None):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+#shared process pool for local extraction, created on first use
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = create_pool(EXTRACTION_WORKERS)
+    return _pool
+
+
+#runs in a worker: load the parsers so the first real extraction doesn't pay for the imports
+def _warm_worker():
+    try:
+        import docx  # noqa: F401
+        import PyPDF2  # noqa: F401
+    except ImportError:
+        pass
+
+
+#start every worker of the shared pool and load the parsers in it
+def prewarm_pool():
+    pool = get_pool()
+    workers = EXTRACTION_WORKERS or os.cpu_count() or 1
+    for future in [pool.submit(_warm_worker) for _ in range(workers)]:
+        future.result()
+
+
+#run local extraction in the process pool without blocking the event loop
+async def extract_text_async(file_path, file_ext):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), extract_text_locally, str(file_path), file_ext)
+
+
+#extract many files in the process pool, results in the same order as paths
+def extract_many(paths, pool=None, chunksize=4):
+    pool = pool or get_pool()
+    exts = [os.path.splitext(str(path))[1].lower() for path in paths]
+    return list(pool.map(extract_text_locally, [str(path) for path in paths], exts, chunksize=chunksize))
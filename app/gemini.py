@@ -0,0 +1,128 @@
+import os
+import asyncio
+import datetime
+import threading
+from app import crud
+
+# google-genai is slow to import, so it is only loaded the first time a client is needed
+_client = None
+_client_lock = threading.Lock()
+
+# Gemini deletes uploaded files after 48 hours
+FILE_TTL = datetime.timedelta(hours=48)
+# treat a handle as expired a little early so it can't run out mid-request
+REFRESH_MARGIN = datetime.timedelta(minutes=10)
+# remote files younger than this may belong to an upload that isn't saved yet
+CLEANUP_GRACE = datetime.timedelta(hours=1)
+
+
+#get the shared Gemini client, creating it on first use
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(api_key=os.getenv("GenEd_Gemini_API_KEY"))
+    return _client
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+#expiry of a remote file as naive utc (what the TIMESTAMP columns store)
+def file_expiry(remote_file):
+    expires = getattr(remote_file, "expiration_time", None)
+    if not expires:
+        return utcnow() + FILE_TTL
+    if expires.tzinfo is not None:
+        expires = expires.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return expires
+
+
+#poll a freshly uploaded file until Gemini has finished processing it
+async def wait_until_processed(client, remote_file, max_wait=30):
+    waited = 0
+    while remote_file.state.name == "PROCESSING" and waited < max_wait:
+        await asyncio.sleep(2)
+        waited += 2
+        remote_file = await asyncio.to_thread(client.files.get, name=remote_file.name)
+
+    if remote_file.state.name == "FAILED":
+        raise Exception("File processing failed in Gemini")
+    return remote_file
+
+
+#upload a local file to Gemini and wait until it can be used in prompts
+async def upload_file(client, file_path):
+    remote_file = await asyncio.to_thread(client.files.upload, path=str(file_path))
+    return await wait_until_processed(client, remote_file)
+
+
+#return a usable remote file for a document, reusing the stored handle while it is live
+#and uploading again (and storing the new handle) only when it has expired or vanished
+async def get_document_file(db, client, doc):
+    if doc.gemini_file_name and doc.gemini_file_expires_at and doc.gemini_file_expires_at - REFRESH_MARGIN > utcnow():
+        try:
+            remote_file = await asyncio.to_thread(client.files.get, name=doc.gemini_file_name)
+            remote_file = await wait_until_processed(client, remote_file)
+            if remote_file.state.name == "ACTIVE":
+                return remote_file
+        except Exception as e:
+            print(f"Stored Gemini file {doc.gemini_file_name} is not usable, uploading again: {e}")
+
+    remote_file = await upload_file(client, doc.file_path)
+    crud.set_document_file_handle(db, doc, remote_file.name, file_expiry(remote_file))
+    return remote_file
+
+
+#forget expired handles and delete remote files that no document refers to any more
+def cleanup_remote_files(db, client):
+    cleared = crud.clear_expired_file_handles(db, utcnow())
+    deleted = 0
+    cutoff = utcnow() - CLEANUP_GRACE
+
+    batch = []
+    for remote_file in client.files.list():
+        created = getattr(remote_file, "create_time", None)
+        if created is not None and created.tzinfo is not None:
+            created = created.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if created is None or created > cutoff:
+            continue
+        batch.append(remote_file.name)
+        if len(batch) >= 100:
+            deleted += _delete_unreferenced(db, client, batch)
+            batch = []
+    if batch:
+        deleted += _delete_unreferenced(db, client, batch)
+
+    return {"cleared_handles": cleared, "deleted_files": deleted}
+
+
+def _delete_unreferenced(db, client, names):
+    referenced = crud.get_referenced_file_names(db, names)
+    deleted = 0
+    for name in names:
+        if name in referenced:
+            continue
+        try:
+            client.files.delete(name=name)
+            deleted += 1
+        except Exception as e:
+            print(f"Failed to delete Gemini file {name}: {e}")
+    return deleted
+
+
+#background loop started from the app lifespan
+async def run_cleanup_loop(session_factory, interval_seconds):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        db = session_factory()
+        try:
+            report = await asyncio.to_thread(cleanup_remote_files, db, get_client())
+            print(f"Gemini file cleanup: {report}")
+        except Exception as e:
+            print(f"Gemini file cleanup failed: {e}")
+        finally:
+            db.close()
@@ -1,40 +1,99 @@
-from fastapi import FastAPI, Form, Depends, HTTPException, Request, UploadFile, File
-from fastapi.responses import RedirectResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Form, Depends, HTTPException, Request, UploadFile, File, BackgroundTasks
+from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine, Base
-from app.models import User, UserRole, Document, Summary, Video, Download
+from app.database import SessionLocal, engine, READ_YOUR_WRITES_SECONDS
+from app.models import User, UserRole, Document, Summary, Video
 from passlib.context import CryptContext
 import os
 import shutil
 import uuid
 from dotenv import load_dotenv
-from google import genai
 import time
-from typing import Optional
+from typing import Optional, List
 from app import schemas
 import asyncio
 from fastapi import Depends, HTTPException
 from pathlib import Path
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.sessions import SessionMiddleware
-from google.genai import types
 from app import crud
-from pathlib import Path
-from docx import Document as DocxDocument
-import PyPDF2
+from app import assets
+from app import extraction
+from app import bulk_import
+from app import gemini
+from app import scheduler
+from app import summaries
+from app import similarity
+from app import media_processing
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from app.compression import CompressionMiddleware
 import time
 
+# optional warm-up so the first requests after a cold start don't pay for it
+# tables are created by a separate step: `python -m app.migrate`
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prewarm_connections = int(os.getenv("PREWARM_DB_CONNECTIONS", "0"))
+    if prewarm_connections:
+        await asyncio.to_thread(prewarm_db, prewarm_connections)
+    if os.getenv("PREWARM_CLIENTS", "false").lower() == "true":
+        await asyncio.to_thread(prewarm_clients)
+
+    # periodically delete Gemini files that no document refers to any more
+    cleanup_task = None
+    cleanup_interval = int(os.getenv("GEMINI_CLEANUP_INTERVAL", "3600"))
+    if cleanup_interval and os.getenv("GenEd_Gemini_API_KEY"):
+        cleanup_task = asyncio.create_task(gemini.run_cleanup_loop(SessionLocal, cleanup_interval))
+
+    yield
+
+    if cleanup_task:
+        cleanup_task.cancel()
+
+
+def prewarm_db(count: int):
+    # check out several connections at once so the pool keeps them open
+    pool_size = engine.pool.size() if hasattr(engine.pool, "size") else count
+    connections = [engine.connect() for _ in range(min(count, pool_size))]
+    for connection in connections:
+        connection.execute(text("SELECT 1"))
+        connection.close()
+
+
+def prewarm_clients():
+    gemini.get_client()
+    # local extraction runs in spawned workers, so warm those rather than this process
+    extraction.prewarm_pool()
+
+
 # initialize
-app = FastAPI()
+# orjson is much faster than the stdlib encoder for every api response
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-templates = Jinja2Templates(directory="templates")
-Base.metadata.create_all(bind=engine)
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+BUILD_DIR = os.path.join(BASE_DIR, "build")
+
+# fingerprint static files and serve them with immutable caching
+asset_manifest = assets.build_static_assets(STATIC_DIR, os.path.join(BUILD_DIR, "static"))
+app.mount(
+    "/static",
+    assets.CachedStaticFiles(static_dir=STATIC_DIR, build_dir=os.path.join(BUILD_DIR, "static"), manifest=asset_manifest),
+    name="static",
+)
+
+# precompiled templates with an on-disk bytecode cache
+template_env = assets.create_template_env(TEMPLATES_DIR, os.path.join(BUILD_DIR, "jinja"), asset_manifest)
+templates = Jinja2Templates(env=template_env)
+
+# pages that look the same for every visitor are rendered once at startup
+prerendered_pages = assets.prerender_pages(
+    template_env, ["index.html", "sign-in.html", "login.html", "change-password.html"]
+)
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 origins=["http://127.0.0.1:5500", "http://localhost:5500"]
 
@@ -46,6 +105,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for api responses, small bodies are sent as-is
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+)
+
 app.add_middleware(
        SessionMiddleware,
        secret_key="your_super_secret_key_here",
@@ -54,11 +119,32 @@ app.add_middleware(
    )
 
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GenEd_Gemini_API_KEY")
+DAILY_UPLOAD_QUOTA = int(os.getenv("DAILY_UPLOAD_QUOTA", "50"))
+DAILY_VIDEO_QUOTA = int(os.getenv("DAILY_VIDEO_QUOTA", "5"))
+DAILY_SUMMARY_QUOTA = int(os.getenv("DAILY_SUMMARY_QUOTA", "20"))
+
+
+#gives a consumed quota unit back when the request fails (bad input, Gemini/Veo error, cancelled)
+@asynccontextmanager
+async def refund_quota_on_error(db: Session, user_id: int, kind: str, charged: bool):
+    try:
+        yield
+    except BaseException:
+        if charged:
+            db.rollback()
+            crud.release_quota(db, user_id, kind)
+        raise
+
 
 # dependency to get the DB session
-def get_db():
-    db = SessionLocal()
+# a user who wrote recently reads from the primary, so e.g. a document is found right after its upload
+def get_db(request: Request):
+    last_write_at = request.session.get("last_write_at", 0)
+
+    def remember_write():
+        request.session["last_write_at"] = time.time()
+
+    db = SessionLocal(primary_until=last_write_at + READ_YOUR_WRITES_SECONDS, on_write=remember_write)
     try:
         yield db
     finally:
@@ -70,12 +156,35 @@ def require_login(request: Request):
         return RedirectResponse(url="/login", status_code=302)
     return user_id
 
+# same as require_login for api routes: no session means 401 instead of a redirect object
+def require_user(request: Request):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Please login first")
+    return user_id
+
+def is_admin(db_user: User) -> bool:
+    return db_user.role == UserRole.admin
+
+# admins get a bigger share of the generation workers
+def scheduler_weight(db_user: User) -> float:
+    return scheduler.ADMIN_WEIGHT if is_admin(db_user) else 1.0
+
+def require_admin(request: Request, db: Session = Depends(get_db)):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Please login first")
+    db_user = crud.get_user(db, user_id)
+    if not db_user or not is_admin(db_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return db_user
+
 
 # Routes
 # home page
 @app.get("/")
 def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return prerendered_pages["index.html"].response(request)
 
 # dashboard page
 @app.get("/dashboard")
@@ -105,13 +214,13 @@ def signup(
             phone_number=phone_number,
         )
     except Exception as e:
-           return JSONResponse(
+           return ORJSONResponse(
         status_code=400,
         content={"message": f"Invalid input: {e}"}
     )
     # check if username or email already exists
     if crud.get_user_by_username(db, username=user_in.username):
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={
                 "message": "Username already exists. Redirecting to login page",
@@ -119,7 +228,7 @@ def signup(
             }
         )   
     if crud.get_user_by_email(db, email=user_in.email):
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={
                 "message": "Email already exists. Redirecting to login page",
@@ -129,7 +238,7 @@ def signup(
     try:
         crud.create_user(db, user_in)
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={
                 "message": f"Error creating user: {e}",
@@ -137,7 +246,7 @@ def signup(
             }
         )
 
-    return JSONResponse(
+    return ORJSONResponse(
     status_code=200,
     content={
         "message": "Signup successful",
@@ -156,21 +265,21 @@ def login(request:Request, user: str = Form(...), password: str = Form(...), db:
     
     if not db_user:
             
-        return JSONResponse(
+        return ORJSONResponse(
           status_code=404,
           content={"message": "User not found. Please sign up first", 
             "redirect": "/signup"}
      )
     
     if not crud.verify_password(password, db_user.password):
-        return JSONResponse(
+        return ORJSONResponse(
         status_code=400,
         content={"message": "Invalid credentials. Please try again", "redirect": "/login"}
     )
     
     request.session["user_id"] = db_user.id  # ← save logged-in user ID
 
-    return JSONResponse(
+    return ORJSONResponse(
     status_code=200,
     content={
         "message": "Login successful",
@@ -188,7 +297,7 @@ def change_password(
     # 1. Get the user
     db_user = crud.get_user_by_username(db , username)
     if not db_user:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=404,
             content={
                 "message": "User not found",
@@ -197,7 +306,7 @@ def change_password(
 
     # 2. Verify old password
     if not crud.verify_password(old_password, db_user.password):
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={
                 "message": "Old password is incorrect"
@@ -208,7 +317,7 @@ def change_password(
     db_user.password = crud.hash_password(new_password)
     db.commit()
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "message": "Password changed successfully", 
@@ -220,15 +329,15 @@ def change_password(
 # Serve signup/login pages
 @app.get("/signup")
 def signup_page(request: Request):
-    return templates.TemplateResponse("sign-in.html", {"request": request})
+    return prerendered_pages["sign-in.html"].response(request)
 
 @app.get("/login")
 def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return prerendered_pages["login.html"].response(request)
 
 @app.get("/change-password")
 def change_password_page(request: Request):
-    return templates.TemplateResponse("change-password.html", {"request": request})
+    return prerendered_pages["change-password.html"].response(request)
 
 @app.get("/dashboard")
 def dashboard(request: Request, user_id: int = Depends(require_login)):
@@ -250,7 +359,7 @@ async def upload_file(
     user_id = request.session.get("user_id")
     print(user_id)
     if not user_id:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=401,
             content={
                 "message": "Please login first",
@@ -261,21 +370,28 @@ async def upload_file(
     # Validate user exists
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=404,
             content={"message": "User not found"}
         )
     
     # Validate file type
-    allowed_extensions = {'.txt', '.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png'}
     file_ext = Path(file.filename).suffix.lower()
 
-    if file_ext not in allowed_extensions:
-        return JSONResponse(
+    if file_ext not in extraction.ALLOWED_EXTENSIONS:
+        return ORJSONResponse(
             status_code=400,
             content={"message": f"File type {file_ext} not allowed"}
         )
     
+    # Check today's upload quota (admins are exempt), it is given back if the upload fails
+    charged = not is_admin(db_user)
+    if charged and not crud.consume_quota(db, user_id, "uploads", DAILY_UPLOAD_QUOTA):
+        return ORJSONResponse(
+            status_code=429,
+            content={"message": f"Daily upload limit of {DAILY_UPLOAD_QUOTA} files reached. Try again tomorrow"}
+        )
+    
     # Create uploads directory if it doesn't exist
     upload_dir = Path("media/uploads")
     upload_dir.mkdir(parents=True, exist_ok=True)
@@ -289,7 +405,9 @@ async def upload_file(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
     except Exception as e:
-        return JSONResponse(
+        if charged:
+            crud.release_quota(db, user_id, "uploads")
+        return ORJSONResponse(
             status_code=500,
             content={"message": f"Failed to save file: {str(e)}"}
         )
@@ -297,110 +415,213 @@ async def upload_file(
   
   
     
-    def extract_text_locally(file_path, file_ext):
-    #Extract text from file using local libraries
-        try:
-            if file_ext == ".txt":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    return f.read()
-        
-            elif file_ext == ".docx":
-                doc = DocxDocument(file_path)
-                return "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
-        
-            elif file_ext == ".pdf":
-                with open(file_path, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    text_parts = []
-                    for page in reader.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_parts.append(page_text)
-                    return "\n".join(text_parts)
-        
-            else:
-                return "[Cannot extract text from this file type locally]"
-    
-        except Exception as e:
-            return f"[Local text extraction failed: {str(e)}]"
-     
     extracted_text = ""
     gemini_success= False
-
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        
+    uploaded = None
+
+    # extraction waits for a fair share of the upload workers
+    async with refund_quota_on_error(db, user_id, "uploads", charged), scheduler.upload_scheduler.slot(user_id, scheduler_weight(db_user)):
+        # local-first mode (EXTRACTION_MODE=local) only calls Gemini when the local engine fails
+        # local extraction returns None when it can't read the file
+        local_text = None
+        local_tried = False
+        if extraction.EXTRACTION_MODE == "local":
+            local_text = await extraction.extract_text_async(file_path, file_ext)
+            local_tried = True
+
+        if not extraction.is_usable_text(local_text):
+            try:
+                client = gemini.get_client()
         
-        # Upload to Gemini
-        uploaded = client.files.upload(
-            path=str(file_path)
-        )
-
-        max_wait = 30
-        waited = 0
-        while uploaded.state.name == "PROCESSING" and waited < max_wait:
-            time.sleep(2)
-            waited += 2
-            uploaded = client.files.get(name=uploaded.name)
         
-        if uploaded.state.name == "FAILED":
-            raise Exception("File processing failed in Gemini")
+                # Upload to Gemini, the handle is stored on the document for reuse
+                uploaded = await gemini.upload_file(client, file_path)
         
-        # Extract text
-        extract_prompt = "Extract all text from the uploaded file and return it as plain text without any formatting or markdown."
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[extract_prompt, uploaded]
-        )
+                # Extract text (the SDK call blocks, keep it off the event loop)
+                extract_prompt = "Extract all text from the uploaded file and return it as plain text without any formatting or markdown."
+                response = await asyncio.to_thread(
+                    client.models.generate_content,
+                    model="gemini-2.5-flash",
+                    contents=[extract_prompt, uploaded]
+                )
         
-        extracted_text = response.text if hasattr(response, 'text') else ""
+                extracted_text = response.text if hasattr(response, 'text') else ""
 
-        if extracted_text and len(extracted_text) > 10:  # Valid extraction
-            gemini_success = True
+                if extracted_text and len(extracted_text) > 10:  # Valid extraction
+                    gemini_success = True
         
-    except Exception as e:
-        # If extraction fails, still save the document but with empty text
-        print(f"Gemini text extraction failed: {e}")
-        #extracted_text = f"[Text extraction failed: {str(e)}]"
-    
-    if not gemini_success or not extracted_text.strip():
-        print(f"Using local extraction for {file_ext} file")
-        extracted_text = extract_text_locally(file_path, file_ext)
+            except Exception as e:
+                # If extraction fails, still save the document but with empty text
+                print(f"Gemini text extraction failed: {e}")
+                #extracted_text = f"[Text extraction failed: {str(e)}]"
+
+        if not gemini_success or not extracted_text.strip():
+            if not local_tried:
+                print(f"Using local extraction for {file_ext} file")
+                local_text = await extraction.extract_text_async(file_path, file_ext)
+            # both failed: the document is still saved, without text
+            extracted_text = local_text or ""
     
     # Save document to database
     try:
-        document = Document(
+        document = crud.create_document(db, schemas.DocumentCreate(
             user_id=user_id,
             doc_name=file.filename,
             file_path=str(file_path),
-            extracted_text=extracted_text
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-        
-        return JSONResponse(
-            status_code=200,
-            content={
-                "message": "File uploaded and text extracted successfully",
-                "document_id": document.id,
-                "filename": file.filename,
-                "extracted_text": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text,
-                "text_length": len(extracted_text),
-                "extraction_method": "Gemini API" if gemini_success else "Local extraction"  
-            }
-        )
+            extracted_text=extracted_text,
+            gemini_file_name=uploaded.name if uploaded else None,
+            gemini_file_expires_at=gemini.file_expiry(uploaded) if uploaded else None,
+        ))
     except Exception as e:
-        return JSONResponse(
+        # don't leave a file on disk that no document refers to
+        file_path.unlink(missing_ok=True)
+        if charged:
+            db.rollback()
+            crud.release_quota(db, user_id, "uploads")
+        return ORJSONResponse(
             status_code=500,
             content={"message": f"Failed to save to database: {str(e)}"}
         )
 
+    return ORJSONResponse(
+        status_code=200,
+        content={
+            "message": "File uploaded and text extracted successfully",
+            "document_id": document.id,
+            "filename": file.filename,
+            "extracted_text": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text,
+            "text_length": len(extracted_text),
+            "extraction_method": "Gemini API" if gemini_success else "Local extraction"
+        }
+    )
+
+
+
+
+
+
+
+
+# find existing summaries and videos made from near-identical text
+# the browser offers these before starting an expensive new generation
+@app.post("/similar")
+def find_similar(
+    document_id: Optional[int] = Form(None),
+    raw_text: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user)
+):
+    source_text = raw_text or ""
+    exclude = set()
+    if document_id:
+        doc = crud.get_document(db, document_id)
+        if not doc or doc.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Document not found")
+        source_text = doc.extracted_text or ""
+        exclude.add(("document", document_id))
+
+    if not source_text.strip():
+        raise HTTPException(status_code=400, detail="No source text provided")
+
+    matches = []
+    for (kind, match_id), score in similarity.find_similar(db, source_text, user_id, exclude):
+        if kind == "document":
+            found_summaries = crud.get_summaries_by_document(db, match_id)
+            found_videos = crud.get_videos_by_source(db, document_id=match_id)
+        else:
+            summary = crud.get_summary(db, match_id)
+            found_summaries = [summary] if summary else []
+            found_videos = crud.get_videos_by_source(db, summary_id=match_id)
+        if not found_summaries and not found_videos:
+            continue
+        matches.append({
+            "kind": kind,
+            "id": match_id,
+            "score": round(score, 3),
+            "summaries": [{"id": item.id, "summary_text": item.summary_text} for item in found_summaries],
+            "videos": [{"id": item.id, "video_name": item.video_name} for item in found_videos],
+        })
+
+    return {"matches": matches}
+
+
+# text to summarize for a document: the stored extraction when it is real content,
+# otherwise extract it again through the document's (cached) Gemini file
+async def document_source_text(db: Session, client, doc: Document) -> str:
+    if extraction.is_usable_text(doc.extracted_text):
+        return doc.extracted_text
+
+    try:
+        # reuse the file uploaded by /upload while Gemini still has it
+        uploaded_file = await gemini.get_document_file(db, client, doc)
+
+        # Extract text
+        extract_prompt = "Extract all text from the uploaded file and return a single block of text."
+        resp = await asyncio.to_thread(
+            client.models.generate_content,
+            model="gemini-2.5-flash",
+            contents=[extract_prompt, uploaded_file]
+        )
+        return getattr(resp, "text", None) or ""
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to extract text from document: {e}")
 
 
+# stream a summary of a document / raw text to the browser as server-sent events
+# the summary is saved when the stream finishes and its id is sent in the final "done" event
+@app.post("/summaries/stream")
+async def stream_summary(
+    document_id: Optional[int] = Form(None),
+    raw_text: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user)
+):
+    db_user = db.query(User).filter(User.id == user_id).first()
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Check today's summary quota (admins are exempt), it is given back if no summary is saved
+    charged = not is_admin(db_user)
+    if charged and not crud.consume_quota(db, user_id, "summaries", DAILY_SUMMARY_QUOTA):
+        raise HTTPException(status_code=429, detail=f"Daily limit of {DAILY_SUMMARY_QUOTA} summaries reached. Try again tomorrow")
 
+    async with refund_quota_on_error(db, user_id, "summaries", charged):
+        source_text = raw_text or ""
+        if document_id:
+            doc = crud.get_document(db, document_id)
+            if not doc or doc.user_id != user_id:
+                raise HTTPException(status_code=404, detail="Document not found")
+            source_text = await document_source_text(db, gemini.get_client(), doc)
 
+        if not source_text.strip():
+            raise HTTPException(status_code=400, detail="No source text provided for the summary")
 
+    weight = scheduler_weight(db_user)
+
+    # the stream waits for a fair share of the summary workers, like uploads and videos
+    async def events():
+        saved = []
+        try:
+            async with scheduler.summary_scheduler.slot(user_id, weight):
+                async for event in summaries.stream_summary(
+                    summaries.get_backend(), SessionLocal, user_id, document_id, source_text, on_saved=saved.append
+                ):
+                    yield event
+        finally:
+            # failed or abandoned streams don't count (the request's session may be closed by now)
+            if charged and not saved:
+                refund_db = SessionLocal()
+                try:
+                    crud.release_quota(refund_db, user_id, "summaries")
+                finally:
+                    refund_db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # generate video from summary / document / raw text
@@ -417,148 +638,138 @@ async def generate_video(
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    client = genai.Client(api_key=GEMINI_API_KEY)
-
-    # determine text source
-    source_text = ""
-    used_summary_id = summary_id
-
-    if summary_id:
-        summary = db.query(Summary).filter(Summary.id == summary_id).first()
-        if not summary:
-            raise HTTPException(status_code=404, detail="Summary not found")
-        source_text = summary.summary_text
+    # Check today's video quota (admins are exempt), it is given back if generation fails
+    charged = not is_admin(db_user)
+    if charged and not crud.consume_quota(db, user_id, "videos", DAILY_VIDEO_QUOTA):
+        raise HTTPException(status_code=429, detail=f"Daily limit of {DAILY_VIDEO_QUOTA} videos reached. Try again tomorrow")
+
+    # generation waits for a fair share of the video workers
+    async with refund_quota_on_error(db, user_id, "videos", charged), scheduler.video_scheduler.slot(user_id, scheduler_weight(db_user)):
+        client = gemini.get_client()
+
+        # determine text source
+        # the summary may have been saved moments ago by /summaries/stream, whose session can't
+        # mark this user as a recent writer, so read the source rows from the primary
+        db.use_primary()
+        source_text = ""
+        used_summary_id = summary_id
+
+        if summary_id:
+            summary = db.query(Summary).filter(Summary.id == summary_id).first()
+            if not summary:
+                raise HTTPException(status_code=404, detail="Summary not found")
+            source_text = summary.summary_text
+
+        elif raw_text:
+            source_text = raw_text
+
+        elif document_id:
+            doc = db.query(Document).filter(Document.id == document_id).first()
+            if not doc:
+                raise HTTPException(status_code=404, detail="Document not found")
+        
+            source_text = await document_source_text(db, client, doc)
 
-    elif raw_text:
-        source_text = raw_text
+        if not source_text:
+            raise HTTPException(status_code=400, detail="No source text provided for video generation")
 
-    elif document_id:
-        doc = db.query(Document).filter(Document.id == document_id).first()
-        if not doc:
-            raise HTTPException(status_code=404, detail="Document not found")
-        
-        if doc.extracted_text and len(doc.extracted_text.strip()) > 10:
-            source_text = doc.extracted_text
-        
-        else:
+        # if there is no pre-existing summary, create a concise summary to base the video on
+        if not summary_id:
             try:
-                uploaded_file = client.files.upload(path=doc.file_path)
-                
-                # Wait for file processing
-                max_wait = 30
-                waited = 0
-                while uploaded_file.state.name == "PROCESSING" and waited < max_wait:
-                    await asyncio.sleep(2)
-                    waited += 2
-                    uploaded_file = client.files.get(name=uploaded_file.name)
-                
-                if uploaded_file.state.name == "FAILED":
-                    raise Exception("File processing failed in Gemini")
-                
-                # Extract text
-                extract_prompt = "Extract all text from the uploaded file and return a single block of text."
-                resp = client.models.generate_content(
+                summary_prompt = "Summarize the following text into a concise paragraph:\n\n" + source_text
+                sum_resp = await asyncio.to_thread(
+                    client.models.generate_content,
                     model="gemini-2.5-flash",
-                    contents=[extract_prompt, uploaded_file]
+                    contents=[summary_prompt]
                 )
-                source_text = getattr(resp, "text", None) or ""
-            
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Failed to extract text from document: {e}")
+                summary_text = getattr(sum_resp, "text", None) or getattr(sum_resp, "content", None) or source_text[:200]
+            except Exception:
+                summary_text = source_text[:200]
+
+            summary = crud.create_summary(db, schemas.SummaryCreate(
+                user_id=user_id,
+                document_id=document_id if document_id else None,
+                summary_text=summary_text
+            ))
+            used_summary_id = summary.id
+        else:
+            summary_text = source_text
 
-    if not source_text:
-        raise HTTPException(status_code=400, detail="No source text provided for video generation")
+        # generate video from the summary_text
+        media_dir = Path("media/videos")
+        media_dir.mkdir(parents=True, exist_ok=True)
+        video_name = f"video_{user_id}_{int(time.time())}.mp4"
+        output_path = media_dir / video_name
 
-    # if there is no pre-existing summary, create a concise summary to base the video on
-    if not summary_id:
         try:
-            summary_prompt = "Summarize the following text into a concise paragraph:\n\n" + source_text
-            sum_resp = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[summary_prompt]
-            )
-            summary_text = getattr(sum_resp, "text", None) or getattr(sum_resp, "content", None) or source_text[:200]
-        except Exception:
-            summary_text = source_text[:200]
+            operation = await asyncio.to_thread(
+        client.models.generate,
+        model="veo-2.0-generate-001",
+        contents=summary_text,
+        config={
+            "video": {
+                "durationSeconds": 6,
+                "aspectRatio": "16:9"
+            }
+        }
+    )
 
-        summary = Summary(user_id=user_id, document_id=document_id if document_id else None, summary_text=summary_text)
-        db.add(summary)
-        db.commit()
-        db.refresh(summary)
-        used_summary_id = summary.id
-    else:
-        summary_text = source_text
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Video generation request failed: {e}")
 
-    # generate video from the summary_text
-    media_dir = Path("media/videos")
-    media_dir.mkdir(parents=True, exist_ok=True)
-    video_name = f"video_{user_id}_{int(time.time())}.mp4"
-    output_path = media_dir / video_name
+        # poll operation (async)
+        max_wait = 60 * 5
+        waited = 0
+        interval = 5
+        while not getattr(operation, "done", False) and waited < max_wait:
+            await asyncio.sleep(interval)
+            waited += interval
+            try:
+                operation = await asyncio.to_thread(client.operations.get, getattr(operation, "name", operation))
+            except Exception:
+                break
 
-    try:
-        operation = client.models.generate(
-    model="veo-2.0-generate-001",
-    contents=summary_text,
-    config={
-        "video": {
-            "durationSeconds": 6,
-            "aspectRatio": "16:9"
-        }
-    }
-)
+        if not getattr(operation, "done", False):
+            raise HTTPException(status_code=500, detail="Video generation did not complete in time")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Video generation request failed: {e}")
-
-    # poll operation (async)
-    max_wait = 60 * 5
-    waited = 0
-    interval = 5
-    while not getattr(operation, "done", False) and waited < max_wait:
-        await asyncio.sleep(interval)
-        waited += interval
         try:
-            operation = client.operations.get(getattr(operation, "name", operation))
+            gen_vid = operation.response.generated_videos[0]
         except Exception:
-            break
-
-    if not getattr(operation, "done", False):
-        raise HTTPException(status_code=500, detail="Video generation did not complete in time")
+            raise HTTPException(status_code=500, detail="No generated video returned by the operation")
 
-    try:
-        gen_vid = operation.response.generated_videos[0]
-    except Exception:
-        raise HTTPException(status_code=500, detail="No generated video returned by the operation")
-
-    # download video bytes (SDK dependent)
-    video_bytes = None
-    try:
-        if hasattr(gen_vid, "file_id"):
-            downloaded = client.files.download(file=gen_vid.file_id)
-            video_bytes = getattr(downloaded, "content", None) or getattr(downloaded, "data", None)
-        elif hasattr(gen_vid, "video") and hasattr(gen_vid.video, "content"):
-            video_bytes = gen_vid.video.content
-    except Exception:
+        # download video bytes (SDK dependent)
         video_bytes = None
+        try:
+            if hasattr(gen_vid, "file_id"):
+                downloaded = await asyncio.to_thread(client.files.download, file=gen_vid.file_id)
+                video_bytes = getattr(downloaded, "content", None) or getattr(downloaded, "data", None)
+            elif hasattr(gen_vid, "video") and hasattr(gen_vid.video, "content"):
+                video_bytes = gen_vid.video.content
+        except Exception:
+            video_bytes = None
 
-    if not video_bytes:
-        raise HTTPException(status_code=500, detail="Failed to download generated video")
+        if not video_bytes:
+            raise HTTPException(status_code=500, detail="Failed to download generated video")
 
-    with open(output_path, "wb") as f:
-        f.write(video_bytes)
+        await asyncio.to_thread(output_path.write_bytes, video_bytes)
 
-    video = Video(
-        user_id=user_id,
-        document_id=document_id if document_id else None,
-        summary_id=used_summary_id,
-        video_name=video_name,
-        video_path=str(output_path),
-    )
-    db.add(video)
-    db.commit()
-    db.refresh(video)
+        try:
+            video = crud.create_video(db, schemas.VideoCreate(
+                user_id=user_id,
+                document_id=document_id if document_id else None,
+                summary_id=used_summary_id,
+                video_name=video_name,
+                video_path=str(output_path),
+            ))
+        except Exception as e:
+            # don't leave a file on disk that no video refers to
+            output_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=500, detail=f"Failed to save video: {e}")
+
+        # segment into HLS and make a thumbnail in the background
+        media_processing.submit(SessionLocal, video.id)
 
-    return schemas.VideoOut.from_orm(video)
+        return schemas.VideoOut.from_orm(video)
 
 
 # endpoint to record download and return file
@@ -576,9 +787,7 @@ def download_video(video_id: int, db: Session = Depends(get_db),user_id: int = D
 
     # create download record if user provided (or skip but best to record if user present)
     if user_id:
-        download = Download(user_id=user_id, video_id=video_id)
-        db.add(download)
-        db.commit()
+        crud.create_download(db, schemas.DownloadCreate(user_id=user_id, video_id=video_id))
 
     if not Path(video.video_path).exists():
         raise HTTPException(status_code=404, detail="Video file not found on server")
@@ -586,7 +795,119 @@ def download_video(video_id: int, db: Session = Depends(get_db),user_id: int = D
     return FileResponse(path=video.video_path, media_type="application/octet-stream", filename=video.video_name)
 
 
+# queue wait times and load of the generation schedulers (admin only)
+@app.get("/admin/metrics/scheduler")
+def admin_scheduler_metrics(admin: User = Depends(require_admin)):
+    return scheduler.metrics()
+
+
+# usage statistics (admin only), served from the precomputed counters
+@app.get("/admin/stats/users/{stats_user_id}", response_model=schemas.UserStatsOut)
+def admin_user_stats(stats_user_id: int, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    stats = crud.get_user_stats(db, stats_user_id)
+    if not stats:
+        if not crud.get_user(db, stats_user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        return schemas.UserStatsOut(user_id=stats_user_id, documents=0, summaries=0, videos=0, downloads=0)
+    return schemas.UserStatsOut.from_orm(stats)
+
+
+@app.get("/admin/stats/videos/top", response_model=List[schemas.VideoStatsOut])
+def admin_top_videos(limit: int = 10, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    return [schemas.VideoStatsOut.from_orm(stats) for stats in crud.get_top_videos(db, min(limit, 100))]
+
 
+# bulk import endpoints (admin only)
+# the import runs in the background, progress is kept in a checkpoint file next to the upload
+@app.post("/admin/import/users", status_code=202)
+def admin_import_users(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    admin: User = Depends(require_admin),
+):
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in {".csv", ".jsonl"}:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .jsonl file")
 
+    import_dir = Path("media/imports")
+    import_dir.mkdir(parents=True, exist_ok=True)
+    import_path = import_dir / f"users_{uuid.uuid4().hex}{file_ext}"
+    with open(import_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
 
+    checkpoint_path = str(import_path) + ".checkpoint"
+    background_tasks.add_task(bulk_import.import_users, SessionLocal, str(import_path), checkpoint_path)
+    return {"message": "User import started", "checkpoint": checkpoint_path}
 
+
+@app.post("/admin/import/documents", status_code=202)
+def admin_import_documents(
+    background_tasks: BackgroundTasks,
+    user_id: int = Form(...),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin),
+):
+    # checked here, the background task can't report an error back to the caller
+    if not crud.get_user(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    import_dir = Path("media/imports") / f"documents_{uuid.uuid4().hex}"
+    import_dir.mkdir(parents=True, exist_ok=True)
+    for upload in files:
+        if Path(upload.filename).suffix.lower() not in extraction.ALLOWED_EXTENSIONS:
+            continue
+        with open(import_dir / Path(upload.filename).name, "wb") as buffer:
+            shutil.copyfileobj(upload.file, buffer)
+
+    checkpoint_path = str(import_dir) + ".checkpoint"
+    background_tasks.add_task(bulk_import.import_documents, SessionLocal, str(import_dir), user_id, checkpoint_path)
+    return {"message": "Document import started", "checkpoint": checkpoint_path}
+
+
+# list the logged-in user's videos for the dashboard
+@app.get("/videos")
+def list_videos(db: Session = Depends(get_db), user_id: int = Depends(require_user)):
+    videos = crud.get_videos_by_user(db, user_id)
+    return [
+        {
+            "id": video.id,
+            "video_name": video.video_name,
+            "generated_at": video.generated_at,
+            "processing_status": video.processing_status,
+            "thumbnail_url": f"/videos/{video.id}/thumbnail" if video.thumbnail_path else None,
+            "hls_url": f"/videos/{video.id}/hls/master.m3u8" if video.hls_path else None,
+            "download_url": f"/download-video/{video.id}",
+        }
+        for video in videos
+    ]
+
+
+# poster image of a video
+@app.get("/videos/{video_id}/thumbnail")
+def video_thumbnail(video_id: int, db: Session = Depends(get_db), user_id: int = Depends(require_user)):
+    video = crud.get_video(db, video_id)
+    if not video or video.user_id != user_id or not video.thumbnail_path or not Path(video.thumbnail_path).exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return FileResponse(path=video.thumbnail_path, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+
+# HLS playlists and segments of a video
+@app.get("/videos/{video_id}/hls/{filename}")
+def video_hls(video_id: int, filename: str, db: Session = Depends(get_db), user_id: int = Depends(require_user)):
+    video = crud.get_video(db, video_id)
+    if not video or video.user_id != user_id or not video.hls_path:
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    # only plain file names from this video's own directory
+    suffix = Path(filename).suffix
+    if Path(filename).name != filename or suffix not in {".m3u8", ".ts"}:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    file_path = Path(video.hls_path).parent / filename
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    if suffix == ".m3u8":
+        return FileResponse(path=file_path, media_type="application/vnd.apple.mpegurl", headers={"Cache-Control": "private, max-age=60"})
+    # segments never change once written
+    return FileResponse(path=file_path, media_type="video/mp2t", headers={"Cache-Control": "private, max-age=31536000, immutable"})
@@ -0,0 +1,208 @@
+#garbage collection of media files that no database row refers to
+#usage: python -m app.media_gc [--dry-run] [--batch-size 500] [--max-files 10000] [--report-missing]
+#
+#each directory is scanned in name order, a batch at a time; every batch is checked against
+#the database with one short read-only query, so no table is locked for long. With
+#--max-files a run stops part way and the next run continues from the saved cursor.
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from app.models import Document, Video
+from app.media_processing import HLS_DIR, THUMBNAIL_DIR
+
+STATE_FILE = Path(os.getenv("MEDIA_GC_STATE_FILE", "media/.gc_state.json"))
+BATCH_SIZE = 500
+
+
+#where a kind of file lives, which column refers to it, and how long an orphan is kept
+#with column=None nothing refers to the files, every entry is removed once it is retention_days old
+#unless in_use(path) says it is still needed
+class RetentionPolicy:
+    def __init__(self, name, directory, column, retention_days, stored_path=None, in_use=None):
+        self.name = name
+        self.directory = Path(directory)
+        self.column = column
+        self.retention_days = retention_days
+        self.in_use = in_use or (lambda path: False)
+        # the value the column holds for a directory entry
+        self.stored_path = stored_path or (lambda entry_name: str(self.directory / entry_name))
+
+
+#an import input (or its checkpoint) whose checkpoint exists and isn't marked finished can still
+#be resumed; inputs without a checkpoint never started, e.g. the server stopped before the task ran
+def import_in_progress(path: Path):
+    checkpoint = path if path.name.endswith(".checkpoint") else path.with_name(path.name + ".checkpoint")
+    try:
+        with open(checkpoint) as f:
+            return not json.load(f).get("finished", False)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        return True
+
+
+def default_policies():
+    return [
+        RetentionPolicy("uploads", "media/uploads", Document.file_path,
+                        float(os.getenv("MEDIA_RETENTION_UPLOAD_DAYS", "7"))),
+        RetentionPolicy("videos", "media/videos", Video.video_path,
+                        float(os.getenv("MEDIA_RETENTION_VIDEO_DAYS", "7"))),
+        RetentionPolicy("hls", HLS_DIR, Video.hls_path,
+                        float(os.getenv("MEDIA_RETENTION_VIDEO_DAYS", "7")),
+                        stored_path=lambda entry_name: str(HLS_DIR / entry_name / "master.m3u8")),
+        RetentionPolicy("thumbnails", THUMBNAIL_DIR, Video.thumbnail_path,
+                        float(os.getenv("MEDIA_RETENTION_VIDEO_DAYS", "7"))),
+        # files and directories handed to the admin bulk importer (app.bulk_import)
+        RetentionPolicy("imports", "media/imports", None,
+                        float(os.getenv("MEDIA_RETENTION_IMPORT_DAYS", "2")),
+                        in_use=import_in_progress),
+    ]
+
+
+def load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _size(path: Path):
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return path.stat().st_size
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+#scan one directory from the saved cursor, deleting orphans older than the retention period
+def collect(session_factory, policy, cursor=None, batch_size=BATCH_SIZE, max_files=None, dry_run=False):
+    report = {"scanned": 0, "orphans": 0, "deleted": 0, "bytes_reclaimed": 0, "kept_recent": 0, "kept_in_use": 0, "cursor": None}
+    if not policy.directory.exists():
+        return report
+
+    names = sorted(entry.name for entry in os.scandir(policy.directory) if not entry.name.startswith("."))
+    if cursor:
+        names = [name for name in names if name > cursor]
+    if max_files is not None:
+        names = names[:max_files]
+
+    cutoff = time.time() - policy.retention_days * 86400
+
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        stored = {policy.stored_path(name): name for name in batch}
+
+        referenced = set()
+        if policy.column is not None:
+            db = session_factory()
+            try:
+                referenced = {row[0] for row in db.query(policy.column).filter(policy.column.in_(list(stored)))}
+            finally:
+                db.close()
+
+        for stored_path, name in stored.items():
+            report["scanned"] += 1
+            if stored_path in referenced:
+                continue
+            report["orphans"] += 1
+
+            path = policy.directory / name
+            try:
+                if path.stat().st_mtime > cutoff:
+                    # may belong to an upload/generation that hasn't saved its row yet
+                    report["kept_recent"] += 1
+                    continue
+                if policy.in_use(path):
+                    report["kept_in_use"] += 1
+                    continue
+                size = _size(path)
+                if not dry_run:
+                    _remove(path)
+                report["deleted"] += 1
+                report["bytes_reclaimed"] += size
+            except FileNotFoundError:
+                continue
+
+        report["cursor"] = batch[-1]
+
+    # reached the end of the directory: start from the beginning next time
+    if max_files is None or len(names) < max_files:
+        report["cursor"] = None
+    return report
+
+
+#rows whose file is gone from disk (reported only, rows are never deleted here)
+def find_missing_files(session_factory, batch_size=BATCH_SIZE):
+    missing = {"documents": [], "videos": []}
+    for key, model, column in (("documents", Document, Document.file_path), ("videos", Video, Video.video_path)):
+        last_id = 0
+        while True:
+            db = session_factory()
+            try:
+                rows = db.query(model.id, column).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            finally:
+                db.close()
+            if not rows:
+                break
+            missing[key].extend(row_id for row_id, path in rows if not os.path.exists(path))
+            last_id = rows[-1][0]
+    return missing
+
+
+def run(session_factory, batch_size=BATCH_SIZE, max_files=None, dry_run=False, report_missing=False):
+    state = load_state()
+    report = {"dry_run": dry_run, "policies": {}}
+
+    for policy in default_policies():
+        result = collect(session_factory, policy, state.get(policy.name), batch_size, max_files, dry_run)
+        state[policy.name] = result.pop("cursor")
+        report["policies"][policy.name] = result
+
+    if not dry_run:
+        save_state(state)
+
+    report["bytes_reclaimed"] = sum(result["bytes_reclaimed"] for result in report["policies"].values())
+    if report_missing:
+        report["missing_files"] = find_missing_files(session_factory, batch_size)
+    return report
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Delete media files that no database row refers to")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted without deleting")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-files", type=int, default=None, help="stop after this many entries per directory")
+    parser.add_argument("--report-missing", action="store_true", help="also list rows whose file is missing")
+    args = parser.parse_args()
+
+    # a file referenced by a row the replicas haven't seen yet must not look orphaned
+    def primary_session():
+        db = SessionLocal()
+        db.use_primary()
+        return db
+
+    report = run(primary_session, args.batch_size, args.max_files, args.dry_run, args.report_missing)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
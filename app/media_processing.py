@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.models import Video
+
+#post-processing of generated videos with a local ffmpeg:
+#- HLS renditions with short segments so playback starts before the whole file arrives
+#- a poster thumbnail for the dashboard
+#jobs run in a small pool in the background, ffmpeg itself does the heavy lifting
+#videos created before this existed (or whose processing failed) are processed with:
+#   python -m app.media_processing backfill [--include-failed] [--limit 100]
+
+HLS_DIR = Path("media/hls")
+THUMBNAIL_DIR = Path("media/thumbnails")
+SEGMENT_SECONDS = 2
+
+# (name, height, video bitrate, audio bitrate), lowest first so players start with it
+RENDITIONS = [
+    ("240p", 240, 400_000, 64_000),
+    ("480p", 480, 1_200_000, 96_000),
+    ("720p", 720, 2_800_000, 128_000),
+]
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("MEDIA_WORKERS", "2")), thread_name_prefix="media")
+
+
+def ffmpeg_binary():
+    return os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+
+
+def _run(command):
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=600)
+
+
+#encode one HLS rendition: <name>.m3u8 plus <name>_000.ts, <name>_001.ts, ...
+def build_rendition(ffmpeg, source, output_dir: Path, name, height, video_bitrate, audio_bitrate):
+    _run([
+        ffmpeg, "-y", "-i", str(source),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale=-2:{height}",
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+        "-b:v", str(video_bitrate), "-maxrate", str(int(video_bitrate * 1.1)), "-bufsize", str(video_bitrate * 2),
+        # a keyframe at every segment boundary so each segment can start playback
+        "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})", "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", str(audio_bitrate),
+        "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+        "-hls_segment_filename", str(output_dir / f"{name}_%03d.ts"),
+        str(output_dir / f"{name}.m3u8"),
+    ])
+
+
+def write_master_playlist(output_dir: Path):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for name, height, video_bitrate, audio_bitrate in RENDITIONS:
+        width = (height * 16 // 9) // 2 * 2
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={video_bitrate + audio_bitrate},RESOLUTION={width}x{height}")
+        lines.append(f"{name}.m3u8")
+    master = output_dir / "master.m3u8"
+    master.write_text("\n".join(lines) + "\n")
+    return master
+
+
+#no seeking: the thumbnail filter picks a representative frame from the start,
+#which also works for clips shorter than a second
+def build_thumbnail(ffmpeg, source, target: Path):
+    _run([
+        ffmpeg, "-y", "-i", str(source),
+        "-frames:v", "1", "-vf", "thumbnail=50,scale=480:-2", "-q:v", "3",
+        str(target),
+    ])
+    return target
+
+
+#segment and thumbnail one video, recording the result on its row
+def process_video(session_factory, video_id: int):
+    db = session_factory()
+    # the row was committed moments ago, a replica may not have it yet
+    db.use_primary()
+    try:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video:
+            return
+
+        ffmpeg = ffmpeg_binary()
+        if not ffmpeg:
+            video.processing_status = "skipped"
+            db.commit()
+            print("ffmpeg not found, skipping video post-processing")
+            return
+
+        video.processing_status = "processing"
+        db.commit()
+
+        output_dir = HLS_DIR / str(video.id)
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
+            for name, height, video_bitrate, audio_bitrate in RENDITIONS:
+                build_rendition(ffmpeg, video.video_path, output_dir, name, height, video_bitrate, audio_bitrate)
+            master = write_master_playlist(output_dir)
+        except Exception as e:
+            stderr = getattr(e, "stderr", b"") or b""
+            print(f"Video post-processing failed for video {video_id}: {e} {stderr[-500:].decode(errors='ignore')}")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            video.processing_status = "failed"
+            db.commit()
+            return
+
+        # the poster is optional, a failure here keeps the finished HLS output
+        thumbnail = None
+        try:
+            thumbnail = build_thumbnail(ffmpeg, video.video_path, THUMBNAIL_DIR / f"{video.id}.jpg")
+        except Exception as e:
+            stderr = getattr(e, "stderr", b"") or b""
+            print(f"Thumbnail failed for video {video_id}: {e} {stderr[-500:].decode(errors='ignore')}")
+
+        video.hls_path = str(master)
+        video.thumbnail_path = str(thumbnail) if thumbnail else None
+        video.processing_status = "ready"
+        db.commit()
+    finally:
+        db.close()
+
+
+#queue a video for post-processing in the background pool
+def submit(session_factory, video_id: int):
+    return _executor.submit(process_video, session_factory, video_id)
+
+
+#process videos still waiting for post-processing, one at a time, oldest first
+def backfill(session_factory, include_failed=False, limit=None):
+    statuses = ["pending", "failed"] if include_failed else ["pending"]
+    db = session_factory()
+    try:
+        query = db.query(Video.id).filter(Video.processing_status.in_(statuses)).order_by(Video.id)
+        if limit:
+            query = query.limit(limit)
+        video_ids = [row[0] for row in query]
+    finally:
+        db.close()
+
+    for video_id in video_ids:
+        process_video(session_factory, video_id)
+        print(f"video {video_id} processed", flush=True)
+
+    db = session_factory()
+    try:
+        db.use_primary()
+        rows = db.query(Video.processing_status).filter(Video.id.in_(video_ids)).all() if video_ids else []
+    finally:
+        db.close()
+    report = {"processed": len(video_ids)}
+    for (status,) in rows:
+        report[status] = report.get(status, 0) + 1
+    return report
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Post-process generated videos (HLS renditions and thumbnails)")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--include-failed", action="store_true", help="also retry videos whose processing failed")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    print(json.dumps(backfill(SessionLocal, args.include_failed, args.limit)))
+
+
+if __name__ == "__main__":
+    main()
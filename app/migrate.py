@@ -0,0 +1,14 @@
+#create any missing tables
+#usage: python -m app.migrate
+#run this once per deploy instead of on every process start
+from app.database import Base, engine
+from app import models  # noqa: F401  registers the models on Base
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    print("Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
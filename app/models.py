@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String,Enum,TIMESTAMP,ForeignKey,Text
+from sqlalchemy import Column, Integer, String,Enum,TIMESTAMP,ForeignKey,Text,Date,UniqueConstraint
+from sqlalchemy import BigInteger, Index, LargeBinary, SmallInteger
 from sqlalchemy import func
 from sqlalchemy.orm import relationship
 import enum
@@ -26,6 +27,18 @@ class User(Base):
     videos = relationship("Video", back_populates="user")
     downloads = relationship("Download", back_populates="user")
 
+#per-user daily usage of the expensive operations, one row per user per day
+class UsageQuota(Base):
+    __tablename__ = "usage_quotas"
+    __table_args__ = (UniqueConstraint("user_id", "quota_date", name="uq_usage_quotas_user_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    quota_date = Column(Date, nullable=False)
+    uploads = Column(Integer, nullable=False, default=0, server_default="0")
+    videos = Column(Integer, nullable=False, default=0, server_default="0")
+    summaries = Column(Integer, nullable=False, default=0, server_default="0")
+
 class Document(Base):
     __tablename__="documents"
 
@@ -34,6 +47,8 @@ class Document(Base):
     doc_name=Column(String(255), nullable=False)
     file_path=Column(String(255), nullable=False)
     extracted_text=Column(Text, nullable=True)
+    gemini_file_name=Column(String(255), nullable=True, index=True)
+    gemini_file_expires_at=Column(TIMESTAMP, nullable=True, index=True)
     uploaded_at=Column(TIMESTAMP, server_default=func.now())
 
     user=relationship("User", back_populates="documents")
@@ -63,6 +78,9 @@ class Video(Base):
     summary_id = Column(Integer, ForeignKey("summaries.id", ondelete="SET NULL"))
     video_name = Column(String(255), nullable=False)
     video_path = Column(String(255), nullable=False)
+    hls_path = Column(String(255), nullable=True)
+    thumbnail_path = Column(String(255), nullable=True)
+    processing_status = Column(String(20), nullable=False, default="pending", server_default="pending")
     generated_at = Column(TIMESTAMP, server_default=func.now())
 
     user = relationship("User", back_populates="videos")
@@ -80,4 +98,51 @@ class Download(Base):
     download_date = Column(TIMESTAMP, server_default=func.now())
 
     user = relationship("User", back_populates="downloads")
-    video = relationship("Video", back_populates="downloads")
\ No newline at end of file
+    video = relationship("Video", back_populates="downloads")
+
+#precomputed per-user counters, kept up to date by the create_* functions in crud.py
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    documents = Column(Integer, nullable=False, default=0, server_default="0")
+    summaries = Column(Integer, nullable=False, default=0, server_default="0")
+    videos = Column(Integer, nullable=False, default=0, server_default="0")
+    downloads = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+#precomputed per-video download counter, indexed so "most downloaded" is a short index scan
+class VideoStats(Base):
+    __tablename__ = "video_stats"
+
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    downloads = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+#MinHash signature of a document's or summary's text (kind is "document" or "summary"),
+#written together with the row by crud.py and used to score near-duplicate candidates
+class SimilaritySignature(Base):
+    __tablename__ = "similarity_signatures"
+    __table_args__ = (UniqueConstraint("kind", "item_id", name="uq_similarity_signatures_item"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(10), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+
+
+#one row per LSH band of a signature; texts that share a band key are lookup candidates
+class SimilarityBand(Base):
+    __tablename__ = "similarity_bands"
+    __table_args__ = (Index("ix_similarity_bands_user_key", "user_id", "band_key"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    kind = Column(String(10), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    band = Column(SmallInteger, nullable=False)
+    band_key = Column(BigInteger, nullable=False)
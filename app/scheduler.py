@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+
+#weighted fair queue in front of expensive work (Gemini extraction, video generation)
+#- at most `capacity` jobs run at once in this process
+#- one user can run at most `per_user_limit` jobs at once, the rest wait in line
+#- waiting jobs are started in order of their virtual finish time, so a user with
+#  200 queued uploads only gets their fair share and a weight of 4 gets 4x the share
+#state lives in this process only: with N uvicorn workers or instances, total capacity
+#is N x capacity and one user can run up to N x per_user_limit jobs at once
+class FairScheduler:
+    def __init__(self, name: str, capacity: int, per_user_limit: int):
+        self.name = name
+        self.capacity = capacity
+        self.per_user_limit = per_user_limit
+        self.running = 0
+        self.running_by_user = defaultdict(int)
+        self.virtual_time = 0.0
+        self.last_finish = {}
+        self.waiting = []
+        self.wait_times = deque(maxlen=1000)
+        self.completed = 0
+        self._counter = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, weight: float = 1.0):
+        start_tag = max(self.virtual_time, self.last_finish.get(user_id, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self.last_finish[user_id] = finish_tag
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self.waiting, (finish_tag, next(self._counter), start_tag, user_id, future))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # granted just before the caller went away: hand the slot back
+            if future.done() and not future.cancelled():
+                self._release(user_id)
+            raise
+
+        self.wait_times.append(time.monotonic() - enqueued_at)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def _release(self, user_id: int):
+        self.running -= 1
+        self.running_by_user[user_id] -= 1
+        if not self.running_by_user[user_id]:
+            del self.running_by_user[user_id]
+        self.completed += 1
+        self._dispatch()
+
+    #start waiting jobs in finish-tag order, skipping users that are at their cap
+    def _dispatch(self):
+        skipped = []
+        while self.running < self.capacity and self.waiting:
+            entry = heapq.heappop(self.waiting)
+            _, _, start_tag, user_id, future = entry
+            if future.done():
+                continue
+            if self.running_by_user[user_id] >= self.per_user_limit:
+                skipped.append(entry)
+                continue
+            self.running += 1
+            self.running_by_user[user_id] += 1
+            self.virtual_time = max(self.virtual_time, start_tag)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self.waiting, entry)
+
+        if not self.waiting and not self.running:
+            # idle: reset tags so they don't grow forever
+            self.virtual_time = 0.0
+            self.last_finish.clear()
+
+    def metrics(self):
+        waits = sorted(self.wait_times)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3)
+
+        return {
+            "running": self.running,
+            "queued": sum(1 for entry in self.waiting if not entry[4].done()),
+            "capacity": self.capacity,
+            "per_user_limit": self.per_user_limit,
+            "completed": self.completed,
+            "wait_seconds": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
+
+
+# all limits are per process, multiply by the number of workers/instances for the deployment total
+PER_USER_CONCURRENCY = int(os.getenv("SCHEDULER_PER_USER_CONCURRENCY", "2"))
+ADMIN_WEIGHT = float(os.getenv("SCHEDULER_ADMIN_WEIGHT", "4"))
+
+upload_scheduler = FairScheduler("upload", int(os.getenv("SCHEDULER_UPLOAD_CAPACITY", "8")), PER_USER_CONCURRENCY)
+video_scheduler = FairScheduler("generate-video", int(os.getenv("SCHEDULER_VIDEO_CAPACITY", "2")), PER_USER_CONCURRENCY)
+summary_scheduler = FairScheduler("summary", int(os.getenv("SCHEDULER_SUMMARY_CAPACITY", "4")), PER_USER_CONCURRENCY)
+
+
+def metrics():
+    return {scheduler.name: scheduler.metrics() for scheduler in (upload_scheduler, video_scheduler, summary_scheduler)}
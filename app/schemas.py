@@ -33,6 +33,9 @@ class DocumentBase(BaseModel):
 #document creation class
 class DocumentCreate(DocumentBase):
     user_id: int
+    extracted_text: Optional[str] = None
+    gemini_file_name: Optional[str] = None
+    gemini_file_expires_at: Optional[datetime.datetime] = None
 
 
 #document output class
@@ -84,6 +87,7 @@ class VideoOut(VideoBase):
     user_id: int
     summary_id: Optional[int]
     document_id: Optional[int]
+    processing_status: Optional[str] = None
     generated_at: datetime.datetime
 
     class Config:
@@ -103,4 +107,24 @@ class DownloadOut(BaseModel):
     download_date: datetime.datetime
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+#per-user usage counters output class
+class UserStatsOut(BaseModel):
+    user_id: int
+    documents: int
+    summaries: int
+    videos: int
+    downloads: int
+
+    class Config:
+        orm_mode = True
+
+#per-video download counter output class
+class VideoStatsOut(BaseModel):
+    video_id: int
+    user_id: int
+    downloads: int
+
+    class Config:
+        orm_mode = True
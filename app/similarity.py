@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+from sqlalchemy import insert, or_
+
+from app.extraction import is_usable_text
+from app.models import Document, Summary, SimilarityBand, SimilaritySignature
+
+if TYPE_CHECKING:
+    import numpy as np
+
+#MinHash + LSH index over document and summary texts, used to find near-duplicates
+#before paying for a new summary and video. Signatures and band keys are stored in the
+#database next to the rows they describe (see crud.py), so every worker shares one index,
+#new texts are searchable as soon as they commit, and nothing is rebuilt at startup.
+#Lookups only compare against the texts that share an LSH band, so they stay fast as the corpus grows.
+#usage (index rows written before this existed, or after changing NUM_PERM/BANDS):
+#   python -m app.similarity backfill [--rebuild] [--batch-size 1000]
+
+NUM_PERM = int(os.getenv("SIMILARITY_NUM_PERM", "128"))
+BANDS = int(os.getenv("SIMILARITY_BANDS", "32"))
+SHINGLE_SIZE = 5
+THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+
+# changing NUM_PERM or BANDS invalidates the stored signatures, run backfill --rebuild afterwards
+# numpy is imported on first use, it adds noticeably to the server's cold start
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+#hash every run of SHINGLE_SIZE words in the text
+def shingle_hashes(text: str) -> "np.ndarray":
+    import numpy as np
+
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        import numpy as np
+
+        rng = np.random.RandomState(seed)
+        # a, b < 2**31 and hashes < 2**32 keep a * x + b inside uint64
+        self.a = rng.randint(1, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self.num_perm = num_perm
+
+    #signature of num_perm 32-bit minimums, one per hash permutation
+    def signature(self, text: str) -> "np.ndarray":
+        import numpy as np
+
+        prime, max_hash = np.uint64(_MERSENNE_PRIME), np.uint64(_MAX_HASH)
+        hashes = shingle_hashes(text)
+        signature = np.full(self.num_perm, max_hash, dtype=np.uint64)
+        # work in chunks so very long documents don't allocate a huge matrix
+        for start in range(0, len(hashes), 4096):
+            chunk = hashes[start:start + 4096]
+            permuted = (np.outer(self.a, chunk) + self.b[:, None]) % prime & max_hash
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+
+_hasher = None
+
+
+#created on first use so importing this module doesn't import numpy
+def get_hasher() -> MinHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = MinHasher(NUM_PERM)
+    return _hasher
+
+
+#one 64-bit key per band; the band number is hashed in so equal rows in different bands don't collide
+def band_keys(signature: "np.ndarray", bands: int = BANDS):
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8, person=band.to_bytes(2, "big"))
+        keys.append(int.from_bytes(digest.digest(), "big", signed=True))
+    return keys
+
+
+#signature and band rows for one text, or None when the text isn't indexed
+def _entry_rows(kind: str, item_id: int, user_id: int, text: str):
+    if not is_usable_text(text):
+        return None
+    signature = get_hasher().signature(text)
+    signature_row = {"kind": kind, "item_id": item_id, "user_id": user_id, "signature": signature.tobytes()}
+    band_rows = [
+        {"kind": kind, "item_id": item_id, "user_id": user_id, "band": band, "band_key": key}
+        for band, key in enumerate(band_keys(signature))
+    ]
+    return signature_row, band_rows
+
+
+#add index rows for (kind, item_id, user_id, text) entries to the session's transaction (the caller commits)
+def add_entries(db, entries):
+    signature_rows, band_rows = [], []
+    for entry in entries:
+        rows = _entry_rows(*entry)
+        if rows:
+            signature_rows.append(rows[0])
+            band_rows.extend(rows[1])
+    if signature_rows:
+        db.execute(insert(SimilaritySignature), signature_rows)
+        db.execute(insert(SimilarityBand), band_rows)
+    return len(signature_rows)
+
+
+def index_document(db, doc):
+    add_entries(db, [("document", doc.id, doc.user_id, doc.extracted_text)])
+
+
+def index_summary(db, summary):
+    add_entries(db, [("summary", summary.id, summary.user_id, summary.summary_text)])
+
+
+#the user's own documents and summaries whose estimated Jaccard similarity with text
+#is at least threshold, best first, as [((kind, item_id), score)]
+def find_similar(db, text: str, user_id: int, exclude=(), threshold: float = THRESHOLD, limit: int = 5):
+    import numpy as np
+
+    signature = get_hasher().signature(text)
+    candidates = db.query(SimilarityBand.kind, SimilarityBand.item_id).filter(
+        SimilarityBand.user_id == user_id, SimilarityBand.band_key.in_(band_keys(signature))
+    ).distinct().all()
+
+    ids_by_kind = defaultdict(list)
+    for kind, item_id in candidates:
+        if (kind, item_id) not in exclude:
+            ids_by_kind[kind].append(item_id)
+    if not ids_by_kind:
+        return []
+
+    rows = db.query(SimilaritySignature.kind, SimilaritySignature.item_id, SimilaritySignature.signature).filter(
+        SimilaritySignature.user_id == user_id,
+        or_(*[
+            (SimilaritySignature.kind == kind) & SimilaritySignature.item_id.in_(ids)
+            for kind, ids in ids_by_kind.items()
+        ]),
+    ).all()
+
+    keys = [(kind, item_id) for kind, item_id, _ in rows]
+    matrix = np.stack([np.frombuffer(stored, dtype=np.uint32) for _, _, stored in rows])
+    scores = (matrix == signature).mean(axis=1)
+    matches = [(key, float(score)) for key, score in zip(keys, scores) if score >= threshold]
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches[:limit]
+
+
+#index documents and summaries that have no signature yet, in batches;
+#with rebuild=True the stored index is dropped and every text is hashed again
+def backfill(db, batch_size: int = 1000, rebuild: bool = False):
+    if rebuild:
+        db.query(SimilarityBand).delete(synchronize_session=False)
+        db.query(SimilaritySignature).delete(synchronize_session=False)
+        db.commit()
+
+    indexed = {}
+    for kind, model, text_column in (("document", Document, Document.extracted_text), ("summary", Summary, Summary.summary_text)):
+        indexed[kind] = 0
+        last_id = 0
+        while True:
+            rows = db.query(model.id, model.user_id, text_column).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            done = {row[0] for row in db.query(SimilaritySignature.item_id).filter(
+                SimilaritySignature.kind == kind, SimilaritySignature.item_id.in_(ids)
+            )}
+            indexed[kind] += add_entries(db, [(kind, row_id, user_id, text) for row_id, user_id, text in rows if row_id not in done])
+            db.commit()
+            last_id = ids[-1]
+    return indexed
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain the near-duplicate index")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--rebuild", action="store_true", help="drop the stored index and hash every text again")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    # "already indexed?" must not be answered by a lagging replica
+    db.use_primary()
+    try:
+        print(json.dumps(backfill(db, args.batch_size, args.rebuild)))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
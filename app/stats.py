@@ -0,0 +1,127 @@
+#rebuild the precomputed user_stats / video_stats tables from the source tables
+#usage: python -m app.stats rebuild [--batch-size 1000]
+#works through users and videos in id order, one short transaction per batch,
+#so it can run against a live database and repair counters that drifted: the stats
+#rows of a batch are locked before counting, so increments committed by the app
+#either land before the count or wait until the batch is written
+import argparse
+import json
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import User, Document, Summary, Video, Download, UserStats, VideoStats
+
+BATCH_SIZE = 1000
+
+
+def _counts_by_user(db: Session, model, user_ids):
+    rows = db.query(model.user_id, func.count(model.id)).filter(model.user_id.in_(user_ids)).group_by(model.user_id)
+    return dict(rows)
+
+
+#create missing stats rows, then lock the batch's rows (SELECT ... FOR UPDATE) in a fresh transaction
+#returns the keys that are locked; counts must be read after this so they include every committed write
+def _lock_stats_rows(db: Session, key_column, keys, make_row):
+    existing = {row[0] for row in db.query(key_column).filter(key_column.in_(keys))}
+    missing = [key for key in keys if key not in existing]
+    try:
+        db.add_all([make_row(key) for key in missing])
+        db.commit()
+    except IntegrityError:
+        # the app created some of them meanwhile, the rest are added with the counts
+        db.rollback()
+    return {row[0] for row in db.query(key_column).filter(key_column.in_(keys)).with_for_update()}
+
+
+#update the locked rows and insert the rest, then release the locks
+def _write_stats(db: Session, model, key, rows, locked):
+    db.bulk_update_mappings(model, [row for row in rows if row[key] in locked])
+    db.add_all([model(**row) for row in rows if row[key] not in locked])
+    db.commit()
+
+
+def rebuild_user_stats(db: Session, batch_size: int = BATCH_SIZE):
+    last_id = 0
+    rebuilt = 0
+    while True:
+        user_ids = [row[0] for row in db.query(User.id).filter(User.id > last_id).order_by(User.id).limit(batch_size)]
+        if not user_ids:
+            break
+
+        locked = _lock_stats_rows(db, UserStats.user_id, user_ids, lambda user_id: UserStats(user_id=user_id))
+        documents = _counts_by_user(db, Document, user_ids)
+        summaries = _counts_by_user(db, Summary, user_ids)
+        videos = _counts_by_user(db, Video, user_ids)
+        downloads = _counts_by_user(db, Download, user_ids)
+
+        _write_stats(db, UserStats, "user_id", [
+            {
+                "user_id": user_id,
+                "documents": documents.get(user_id, 0),
+                "summaries": summaries.get(user_id, 0),
+                "videos": videos.get(user_id, 0),
+                "downloads": downloads.get(user_id, 0),
+            }
+            for user_id in user_ids
+        ], locked)
+
+        rebuilt += len(user_ids)
+        last_id = user_ids[-1]
+    return rebuilt
+
+
+def rebuild_video_stats(db: Session, batch_size: int = BATCH_SIZE):
+    last_id = 0
+    rebuilt = 0
+    while True:
+        videos = db.query(Video.id, Video.user_id).filter(Video.id > last_id).order_by(Video.id).limit(batch_size).all()
+        if not videos:
+            break
+
+        video_ids = [video_id for video_id, _ in videos]
+        owners = dict(videos)
+        locked = _lock_stats_rows(
+            db, VideoStats.video_id, video_ids,
+            lambda video_id: VideoStats(video_id=video_id, user_id=owners[video_id]),
+        )
+        downloads = dict(
+            db.query(Download.video_id, func.count(Download.id))
+            .filter(Download.video_id.in_(video_ids))
+            .group_by(Download.video_id)
+        )
+
+        _write_stats(db, VideoStats, "video_id", [
+            {"video_id": video_id, "user_id": user_id, "downloads": downloads.get(video_id, 0)}
+            for video_id, user_id in videos
+        ], locked)
+
+        rebuilt += len(videos)
+        last_id = video_ids[-1]
+    return rebuilt
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain precomputed usage statistics")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    # counts are written to the primary, so read them there too, not from a lagging replica
+    db.use_primary()
+    try:
+        report = {
+            "users": rebuild_user_stats(db, args.batch_size),
+            "videos": rebuild_video_stats(db, args.batch_size),
+        }
+    finally:
+        db.close()
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import orjson
+
+from app import crud, gemini, schemas
+
+SUMMARY_MODEL = "gemini-2.5-flash"
+SUMMARY_PROMPT = "Summarize the following text into a concise paragraph:\n\n"
+
+
+#streams summary text from Gemini as it is generated
+class GeminiStreamingBackend:
+    def __init__(self, model: str = SUMMARY_MODEL):
+        self.model = model
+
+    async def stream(self, prompt: str):
+        client = gemini.get_client()
+        response = await client.aio.models.generate_content_stream(model=self.model, contents=[prompt])
+        async for chunk in response:
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+
+
+#offline stand-in for GeminiStreamingBackend, used by the benchmark and for local testing
+#waits first_token_delay before the first chunk and token_delay between the rest
+class FakeStreamingBackend:
+    def __init__(self, text: str = None, words_per_chunk: int = 3, first_token_delay: float = 0.4, token_delay: float = 0.05):
+        self.text = text
+        self.words_per_chunk = words_per_chunk
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    async def stream(self, prompt: str):
+        words = (self.text or prompt[len(SUMMARY_PROMPT):][:1000]).split()
+        await asyncio.sleep(self.first_token_delay)
+        for i in range(0, len(words), self.words_per_chunk):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield " ".join(words[i:i + self.words_per_chunk]) + " "
+
+
+#SUMMARY_BACKEND=fake runs the app without calling Gemini
+def get_backend():
+    if os.getenv("SUMMARY_BACKEND", "gemini").lower() == "fake":
+        return FakeStreamingBackend()
+    return GeminiStreamingBackend()
+
+
+#format one server-sent event
+def sse_event(data: dict, event: str = None) -> bytes:
+    message = b""
+    if event:
+        message += f"event: {event}\n".encode()
+    return message + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+#stream a summary as server-sent events and save it once the stream completes
+#events: "data: {text}" per chunk, then "event: done" with the summary id, or "event: error"
+#on_saved(summary) is called once the summary is stored
+async def stream_summary(backend, session_factory, user_id: int, document_id, source_text: str, on_saved=None):
+    parts = []
+    try:
+        async for text in backend.stream(SUMMARY_PROMPT + source_text):
+            parts.append(text)
+            yield sse_event({"text": text})
+    except Exception as e:
+        yield sse_event({"message": f"Summary generation failed: {e}"}, event="error")
+        return
+
+    summary_text = "".join(parts).strip()
+    if not summary_text:
+        yield sse_event({"message": "Summary generation returned no text"}, event="error")
+        return
+
+    # the request's session is closed by the time the stream ends, so use a new one
+    db = session_factory()
+    try:
+        summary = crud.create_summary(db, schemas.SummaryCreate(
+            user_id=user_id,
+            document_id=document_id,
+            summary_text=summary_text,
+        ))
+        if on_saved:
+            on_saved(summary)
+        yield sse_event({"summary_id": summary.id}, event="done")
+    finally:
+        db.close()
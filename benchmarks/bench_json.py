@@ -0,0 +1,92 @@
+#micro-benchmark for api response serialization and compression
+#usage: python benchmarks/bench_json.py [--rows 500] [--repeat 200]
+import argparse
+import datetime
+import gzip
+import json
+import random
+import string
+import timeit
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = ["photosynthesis", "chlorophyll", "energy", "the", "plants", "light", "glucose", "cell",
+         "process", "water", "carbon", "dioxide", "oxygen", "leaf", "student", "lesson", "notes"]
+
+
+def fake_text(n_words):
+    return " ".join(random.choice(WORDS) for _ in range(n_words))
+
+
+#payloads shaped like the upload response and the document/summary listings
+def make_payloads(rows):
+    now = datetime.datetime(2025, 1, 1, 12, 0, 0)
+    upload = {
+        "message": "File uploaded and text extracted successfully",
+        "document_id": 42,
+        "filename": "biology_notes.pdf",
+        "extracted_text": fake_text(90)[:500] + "...",
+        "text_length": 12000,
+        "extraction_method": "Gemini API",
+    }
+    documents = [
+        {
+            "id": i,
+            "user_id": 7,
+            "doc_name": "notes_" + "".join(random.choices(string.ascii_lowercase, k=8)) + ".pdf",
+            "file_path": f"media/uploads/7_{1700000000 + i}_notes.pdf",
+            "extracted_text": fake_text(300),
+            "uploaded_at": (now + datetime.timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(rows)
+    ]
+    summaries = [
+        {
+            "id": i,
+            "user_id": 7,
+            "document_id": i,
+            "summary_text": fake_text(80),
+            "created_at": (now + datetime.timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(rows)
+    ]
+    return {"upload": upload, "documents": documents, "summaries": summaries}
+
+
+def stdlib_dumps(obj):
+    # same settings starlette's JSONResponse uses
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    payloads = make_payloads(args.rows)
+
+    print(f"{'payload':<10} {'json ms':>9} {'orjson ms':>10} {'speedup':>8} {'raw KB':>8} {'gzip KB':>8} {'br KB':>8}")
+    for name, payload in payloads.items():
+        stdlib_time = timeit.timeit(lambda: stdlib_dumps(payload), number=args.repeat) / args.repeat
+        orjson_time = timeit.timeit(lambda: orjson.dumps(payload), number=args.repeat) / args.repeat
+
+        body = orjson.dumps(payload)
+        gzip_size = len(gzip.compress(body, compresslevel=6))
+        br_size = len(brotli.compress(body, quality=4)) if brotli else float("nan")
+
+        print(
+            f"{name:<10} {stdlib_time * 1000:>9.3f} {orjson_time * 1000:>10.3f} "
+            f"{stdlib_time / orjson_time:>7.1f}x {len(body) / 1024:>8.1f} "
+            f"{gzip_size / 1024:>8.1f} {br_size / 1024:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#throughput of local OCR over fixture images, by worker count and downscaling
+#fixtures are generated with Pillow into a temporary directory (needs tesseract installed)
+#usage: python benchmarks/bench_ocr.py [--images 24] [--workers 1,2,4] [--size 3000x4000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.extraction import create_pool, ocr_image
+
+LINES = [
+    "Photosynthesis converts light energy into chemical energy.",
+    "Plants take in carbon dioxide and water and release oxygen.",
+    "Chlorophyll in the chloroplasts absorbs mostly red and blue light.",
+    "The glucose produced is used for growth and stored as starch.",
+]
+
+
+#a page of text roughly the size of a phone photo of printed notes
+def make_fixture(path, width, height):
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", max(24, width // 40))
+    except OSError:
+        font = ImageFont.load_default()
+    line_height = max(40, width // 25)
+    y = line_height
+    while y < height - line_height:
+        draw.text((line_height, y), LINES[(y // line_height) % len(LINES)], fill="black", font=font)
+        y += line_height
+    image.save(path, quality=90)
+
+
+def run(paths, workers, max_dimension):
+    started = time.perf_counter()
+    # same spawned pool the app uses, so worker start-up is included
+    with create_pool(workers) as pool:
+        texts = list(pool.map(ocr_image, paths, [max_dimension] * len(paths), chunksize=2))
+    elapsed = time.perf_counter() - started
+    characters = sum(len(text) for text in texts)
+    return elapsed, characters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 4}")
+    parser.add_argument("--size", default="3000x4000")
+    args = parser.parse_args()
+
+    width, height = (int(part) for part in args.size.split("x"))
+    worker_counts = sorted({int(w) for w in args.workers.split(",")})
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(fixture_dir, f"page_{i:03d}.jpg")
+            make_fixture(path, width, height)
+            paths.append(path)
+
+        print(f"{args.images} images of {width}x{height}")
+        print(f"{'workers':>8} {'max dim':>8} {'seconds':>8} {'images/s':>9} {'chars':>8}")
+        for max_dimension in (0, 2000):
+            for workers in worker_counts:
+                elapsed, characters = run(paths, workers, max_dimension)
+                label = max_dimension or "full"
+                print(f"{workers:>8} {label:>8} {elapsed:>8.2f} {args.images / elapsed:>9.2f} {characters:>8}")
+
+
+if __name__ == "__main__":
+    main()
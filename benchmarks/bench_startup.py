@@ -0,0 +1,57 @@
+#measure how long `import app.main` takes using python -X importtime
+#usage: python benchmarks/bench_startup.py [--runs 5] [--top 15]
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+#run one fresh interpreter and return {module: (self_us, cumulative_us)} for top-level imports
+def measure(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr.strip().splitlines()[-1])
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings[name] = (int(self_us), int(cumulative_us), len(indent))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [run[args.module][1] / 1000 for run in runs]
+    print(f"import {args.module}: median {statistics.median(totals):.1f} ms, "
+          f"min {min(totals):.1f} ms, max {max(totals):.1f} ms over {args.runs} runs")
+
+    # heaviest packages pulled in directly by the app (shallowest entries only)
+    last = runs[-1]
+    top_level = [(name, cumulative) for name, (_, cumulative, depth) in last.items() if depth <= 1 and name != args.module]
+    print(f"\n{'module':<40} {'cumulative ms':>14}")
+    for name, cumulative in sorted(top_level, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>14.1f}")
+
+    print()
+    for heavy in ("google.genai", "PyPDF2", "docx"):
+        print(f"{heavy} imported at startup: {'yes' if heavy in last else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#time-to-first-token of the streamed summary endpoint vs waiting for the whole summary
+#runs offline: uses FakeStreamingBackend and an in-memory SQLite database
+#usage: python benchmarks/bench_ttft.py [--runs 10] [--first-token-delay 0.4] [--token-delay 0.05]
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app import models  # noqa: F401
+from app.summaries import FakeStreamingBackend, stream_summary
+
+SOURCE_TEXT = ("Photosynthesis is the process plants use to turn light, water and carbon dioxide "
+               "into glucose and oxygen. " * 20)
+SUMMARY_TEXT = " ".join(["Plants turn light, water and carbon dioxide into glucose and oxygen."] * 8)
+
+
+async def measure_stream(backend, session_factory):
+    started = time.perf_counter()
+    first_event = None
+    async for event in stream_summary(backend, session_factory, 1, None, SOURCE_TEXT):
+        if first_event is None:
+            first_event = time.perf_counter() - started
+    return first_event, time.perf_counter() - started
+
+
+async def measure_blocking(backend):
+    # what the browser waited for before: the complete summary in one response
+    started = time.perf_counter()
+    "".join([text async for text in backend.stream(SOURCE_TEXT)])
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.4)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    backend = FakeStreamingBackend(SUMMARY_TEXT, first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+
+    streamed = [await measure_stream(backend, session_factory) for _ in range(args.runs)]
+    blocking = [await measure_blocking(backend) for _ in range(args.runs)]
+
+    ttft = statistics.median(first for first, _ in streamed)
+    total = statistics.median(total for _, total in streamed)
+    full = statistics.median(blocking)
+    print(f"streamed: first token after {ttft * 1000:.0f} ms, complete after {total * 1000:.0f} ms")
+    print(f"blocking: first text after {full * 1000:.0f} ms")
+    print(f"first text shown {full / ttft:.1f}x sooner")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
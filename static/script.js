@@ -3,6 +3,96 @@ function redirectToPage(url) {
     window.location.href = url;
 }
 
+// Stream a summary over server-sent events, rendering text as it arrives
+// Resolves with the id of the saved summary
+async function streamSummary(documentId, outputEl) {
+    const formData = new FormData();
+    formData.append('document_id', documentId);
+
+    const response = await fetch('/summaries/stream', {
+        method: 'POST',
+        body: formData
+    });
+
+    if (!response.ok || !response.body) {
+        let message = "Summary generation failed";
+        try {
+            message = (await response.json()).detail || message;
+        } catch (e) {}
+        throw new Error(message);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    outputEl.value = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = "message";
+            let data = "";
+            for (const line of rawEvent.split("\n")) {
+                if (line.startsWith("event: ")) eventName = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            if (!data) continue;
+            const payload = JSON.parse(data);
+
+            if (eventName === "done") return payload.summary_id;
+            if (eventName === "error") throw new Error(payload.message);
+            outputEl.value += payload.text;
+            outputEl.scrollTop = outputEl.scrollHeight;
+        }
+    }
+    throw new Error("Summary stream ended unexpectedly");
+}
+
+// Look for a video already made from near-identical text
+// Returns the first match that has a video, or null
+async function findSimilarVideo(documentId) {
+    const formData = new FormData();
+    formData.append('document_id', documentId);
+    try {
+        const response = await fetch('/similar', {
+            method: 'POST',
+            body: formData
+        });
+        if (!response.ok) return null;
+        const result = await response.json();
+        return result.matches.find(match => match.videos.length > 0) || null;
+    } catch (error) {
+        console.error("Similarity lookup error:", error);
+        return null;
+    }
+}
+
+// Point the player and download button at an existing video
+function showVideo(videoId) {
+    const videoEl = document.getElementById('generated-video');
+    const videoSrcEl = document.getElementById('generated-video-src');
+    if (videoEl && videoSrcEl) {
+        videoSrcEl.src = `/download-video/${videoId}`;
+        videoEl.load();
+    }
+
+    const downloadBtn = document.getElementById('download-btn');
+    if (downloadBtn) {
+        downloadBtn.disabled = false;
+        downloadBtn.onclick = () => {
+            window.location.href = `/download-video/${videoId}`;
+        };
+    }
+}
+
 // Upload file function - properly handles file upload to backend
 async function setupFileUpload() {
     const uploadForm = document.getElementById('upload-form');
@@ -86,13 +176,46 @@ async function setupFileUpload() {
                 return;
             }
             
-            statusEl.textContent = "Generating video... This may take a few minutes.";
-            statusEl.style.color = "blue";
             generateBtn.disabled = true;
             
             try {
+                // Offer an existing video when this document is a near-duplicate
+                const similar = await findSimilarVideo(currentDocumentId);
+                if (similar) {
+                    const percent = Math.round(similar.score * 100);
+                    if (confirm(`A video already exists for a document that is ${percent}% similar. Use it instead of generating a new one?`)) {
+                        const existing = similar.videos[0];
+                        showVideo(existing.id);
+                        const summaryEl = document.getElementById('summary-text');
+                        if (summaryEl && similar.summaries.length > 0) {
+                            summaryEl.value = similar.summaries[0].summary_text;
+                        }
+                        statusEl.textContent = "Showing existing video";
+                        statusEl.style.color = "green";
+                        return;
+                    }
+                }
+
                 const formData = new FormData();
                 formData.append('document_id', currentDocumentId);
+
+                // Show the summary while it is written, then make the video from it
+                const summaryEl = document.getElementById('summary-text');
+                if (summaryEl) {
+                    statusEl.textContent = "Summarizing...";
+                    statusEl.style.color = "blue";
+                    try {
+                        const summaryId = await streamSummary(currentDocumentId, summaryEl);
+                        formData.append('summary_id', summaryId);
+                    } catch (error) {
+                        // generate-video can still summarize the document itself
+                        console.error("Summary stream error:", error);
+                        summaryEl.value = "";
+                    }
+                }
+
+                statusEl.textContent = "Generating video... This may take a few minutes.";
+                statusEl.style.color = "blue";
                 
                 const response = await fetch('/generate-video', {
                     method: 'POST',
@@ -127,7 +250,7 @@ async function setupFileUpload() {
                 }
                 
             } catch (error) {
-                statusEl.textContent = "Error generating video";
+                statusEl.textContent = error.message || "Error generating video";
                 statusEl.style.color = "red";
                 console.error("Generation error:", error);
             } finally {
@@ -137,9 +260,90 @@ async function setupFileUpload() {
     }
 }
 
+// Play an HLS stream, natively where supported and with hls.js elsewhere
+// hls.js is our own pinned copy (static/vendor/hls.min.js, fingerprinted like every asset);
+// without it, or without MSE support, the mp4 is played directly (it is served with range requests)
+async function playStream(videoEl, video) {
+    const hlsSrc = document.body.dataset.hlsSrc;
+    if (!video.hls_url) {
+        videoEl.src = video.download_url;
+    } else if (videoEl.canPlayType('application/vnd.apple.mpegurl')) {
+        videoEl.src = video.hls_url;
+    } else if (!hlsSrc) {
+        videoEl.src = video.download_url;
+    } else {
+        try {
+            // hls.js is only loaded the first time someone presses play
+            if (!window.Hls) {
+                await new Promise((resolve, reject) => {
+                    const script = document.createElement('script');
+                    script.src = hlsSrc;
+                    script.onload = resolve;
+                    script.onerror = reject;
+                    document.head.appendChild(script);
+                });
+            }
+            if (!window.Hls.isSupported()) throw new Error("hls.js is not supported in this browser");
+            const hls = new window.Hls();
+            hls.loadSource(video.hls_url);
+            hls.attachMedia(videoEl);
+        } catch (error) {
+            console.error("HLS playback error:", error);
+            videoEl.src = video.download_url;
+        }
+    }
+    videoEl.play();
+}
+
+// Dashboard: one card per video with its thumbnail, the video loads only when played
+async function setupVideoCards() {
+    const cardsEl = document.getElementById('video-cards');
+    if (!cardsEl) return; // Exit if not on dashboard
+
+    try {
+        const response = await fetch('/videos');
+        if (!response.ok) return;
+        const videos = await response.json();
+        if (videos.length === 0) return;
+
+        cardsEl.innerHTML = "";
+        for (const video of videos) {
+            const card = document.createElement('div');
+            card.className = 'card-container';
+
+            const title = document.createElement('div');
+            title.className = 'card-title';
+            title.textContent = video.video_name;
+
+            const player = document.createElement('video');
+            player.controls = true;
+            player.preload = 'none';
+            player.style.width = '100%';
+            if (video.thumbnail_url) player.poster = video.thumbnail_url;
+            player.addEventListener('play', () => {
+                if (!player.dataset.loaded) {
+                    player.dataset.loaded = "true";
+                    playStream(player, video);
+                }
+            });
+
+            card.appendChild(title);
+            card.appendChild(player);
+            cardsEl.appendChild(card);
+        }
+    } catch (error) {
+        console.error("Video list error:", error);
+    }
+}
+
 // Initialize when DOM is ready
+function init() {
+    setupFileUpload();
+    setupVideoCards();
+}
+
 if (document.readyState === 'loading') {
-    document.addEventListener('DOMContentLoaded', setupFileUpload);
+    document.addEventListener('DOMContentLoaded', init);
 } else {
-    setupFileUpload();
+    init();
 }
\ No newline at end of file
@@ -0,0 +1,144 @@
+#read/write routing of RoutingSession, checked against sqlite files
+#each database holds a marker row, so a SELECT shows which one answered
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import Column, MetaData, String, Table, create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import ReplicaPool, RoutingSession
+
+
+metadata = MetaData()
+marker = Table("marker", metadata, Column("name", String(20)))
+
+
+def make_engine(path, name):
+    engine = create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(marker).values(name=name))
+    return engine
+
+
+def answered_by(db):
+    return db.execute(select(marker.c.name)).scalar()
+
+
+@pytest.fixture
+def databases(tmp_path):
+    primary = make_engine(tmp_path / "primary.db", "primary")
+    replicas = [make_engine(tmp_path / f"replica{i}.db", f"replica{i}") for i in (1, 2)]
+    pool = ReplicaPool(replicas, background=False)
+    factory = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, primary=primary, replicas=pool)
+    return primary, pool, factory
+
+
+def test_reads_round_robin_over_replicas(databases):
+    _, _, factory = databases
+    seen = set()
+    for _ in range(4):
+        db = factory()
+        seen.add(answered_by(db))
+        db.close()
+    assert seen == {"replica1", "replica2"}
+
+
+def test_transaction_keeps_one_replica(databases):
+    _, _, factory = databases
+    db = factory()
+    first = answered_by(db)
+    assert all(answered_by(db) == first for _ in range(3))
+    db.close()
+
+
+def test_writes_go_to_primary_and_session_sticks(databases):
+    _, _, factory = databases
+    db = factory()
+    assert answered_by(db).startswith("replica")
+    db.execute(insert(marker).values(name="written"))
+    db.commit()
+    names = set(db.execute(select(marker.c.name)).scalars())
+    assert names == {"primary", "written"}
+    db.close()
+
+
+def test_on_write_called_only_after_a_write(databases):
+    _, _, factory = databases
+    writes = []
+
+    db = factory(on_write=lambda: writes.append(time.time()))
+    answered_by(db)
+    db.commit()
+    assert writes == []
+
+    db.execute(insert(marker).values(name="written"))
+    db.commit()
+    assert len(writes) == 1
+    db.close()
+
+
+def test_primary_until_pins_a_new_session(databases):
+    _, _, factory = databases
+    db = factory(primary_until=time.time() + 60)
+    assert answered_by(db) == "primary"
+    db.close()
+
+    db = factory(primary_until=time.time() - 1)
+    assert answered_by(db).startswith("replica")
+    db.close()
+
+
+def test_use_primary(databases):
+    _, _, factory = databases
+    db = factory()
+    db.use_primary()
+    assert answered_by(db) == "primary"
+    db.close()
+
+
+def test_unhealthy_replica_is_skipped(databases, tmp_path):
+    primary, pool, _ = databases
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    pool = ReplicaPool([broken] + pool.engines, background=False)
+    pool.check_all()
+    assert pool.healthy[broken] is False
+
+    factory = sessionmaker(class_=RoutingSession, primary=primary, replicas=pool)
+    for _ in range(4):
+        db = factory()
+        assert answered_by(db) in {"replica1", "replica2"}
+        db.close()
+
+
+def test_all_replicas_down_falls_back_to_primary(databases):
+    primary, pool, factory = databases
+    for engine in pool.engines:
+        pool.mark_unhealthy(engine)
+    db = factory()
+    assert answered_by(db) == "primary"
+    db.close()
+
+    # a later health check brings them back
+    pool.check_all()
+    db = factory()
+    assert answered_by(db).startswith("replica")
+    db.close()
+
+
+def test_background_checks_do_not_block_choose(tmp_path):
+    replica = make_engine(tmp_path / "replica.db", "replica")
+    pool = ReplicaPool([replica], check_interval=0.05)
+    try:
+        assert pool.choose() is replica
+        pool.mark_unhealthy(replica)
+        assert pool.choose() is None
+        deadline = time.time() + 5
+        while pool.choose() is None and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.choose() is replica
+    finally:
+        pool.stop()
@@ -0,0 +1,22 @@
+#local extraction reports failure as None; real text is usable whatever it starts with
+from app.extraction import extract_text_locally, is_usable_text
+
+
+def test_text_starting_with_a_bracket_is_usable(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("[1] Smith, J. Photosynthesis in C4 plants. Journal of Botany, 2020.", encoding="utf-8")
+    text = extract_text_locally(str(path), ".txt")
+    assert text.startswith("[1]")
+    assert is_usable_text(text)
+
+
+def test_failures_return_none(tmp_path):
+    assert extract_text_locally(str(tmp_path / "missing.txt"), ".txt") is None
+    assert extract_text_locally(str(tmp_path / "slides.pptx"), ".pptx") is None
+    assert not is_usable_text(None)
+
+
+def test_legacy_placeholders_are_not_usable():
+    assert not is_usable_text("[Cannot extract text from this file type locally]")
+    assert not is_usable_text("[Local text extraction failed: file is encrypted]")
+    assert not is_usable_text("too short")
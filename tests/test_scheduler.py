@@ -0,0 +1,105 @@
+#ordering, per-user caps and cancellation of the weighted fair queue
+import asyncio
+
+from app.scheduler import FairScheduler
+
+
+async def _job(scheduler, user_id, started, release, weight=1.0):
+    async with scheduler.slot(user_id, weight):
+        started.append(user_id)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_heavy_user_does_not_starve_others():
+    async def scenario():
+        scheduler = FairScheduler("test", capacity=1, per_user_limit=1)
+        started, gate = [], asyncio.Event()
+        blocker = asyncio.create_task(_job(scheduler, 0, started, gate))
+        await _settle()
+
+        async def quick(user_id):
+            async with scheduler.slot(user_id):
+                started.append(user_id)
+
+        # user 1 queues five jobs before user 2 queues one
+        tasks = [asyncio.create_task(quick(1)) for _ in range(5)]
+        tasks.append(asyncio.create_task(quick(2)))
+        await _settle()
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        return started[1:]
+
+    order = asyncio.run(scenario())
+    # user 2 goes no later than user 1's second job instead of after all five
+    assert order.index(2) <= 1
+    assert order.count(1) == 5
+
+
+def test_per_user_limit():
+    async def scenario():
+        scheduler = FairScheduler("test", capacity=4, per_user_limit=2)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_job(scheduler, 1, started, release)) for _ in range(3)]
+        tasks.append(asyncio.create_task(_job(scheduler, 2, started, release)))
+        await _settle()
+        snapshot = (sorted(started), scheduler.running, scheduler.metrics()["queued"])
+        release.set()
+        await asyncio.gather(*tasks)
+        return snapshot, scheduler.running, sorted(started)
+
+    snapshot, running_after, started = asyncio.run(scenario())
+    assert snapshot == ([1, 1, 2], 3, 1)
+    assert running_after == 0
+    assert started == [1, 1, 1, 2]
+
+
+def test_weight_gives_a_larger_share():
+    async def scenario():
+        scheduler = FairScheduler("test", capacity=1, per_user_limit=10)
+        started = []
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(_job(scheduler, 0, started, gate))
+        await _settle()
+
+        async def quick(user_id, weight):
+            async with scheduler.slot(user_id, weight):
+                started.append(user_id)
+
+        tasks = [asyncio.create_task(quick(1, 1.0)) for _ in range(4)]
+        tasks += [asyncio.create_task(quick(2, 4.0)) for _ in range(4)]
+        await _settle()
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        return started[1:]
+
+    order = asyncio.run(scenario())
+    # the weight-4 user gets all of its jobs in before the weight-1 user's second one
+    assert order[:5].count(2) == 4
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        scheduler = FairScheduler("test", capacity=1, per_user_limit=1)
+        started, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_job(scheduler, 0, started, release))
+        await _settle()
+
+        waiter = asyncio.create_task(_job(scheduler, 1, started, asyncio.Event()))
+        later = asyncio.create_task(_job(scheduler, 2, started, release))
+        await _settle()
+        waiter.cancel()
+        await _settle()
+        release.set()
+        await asyncio.gather(blocker, later)
+        await asyncio.gather(waiter, return_exceptions=True)
+        return started, scheduler.running, dict(scheduler.running_by_user)
+
+    started, running, by_user = asyncio.run(scenario())
+    assert started == [0, 2]
+    assert running == 0
+    assert by_user == {}